@@ -2,37 +2,61 @@ from flask import Flask, render_template, request, jsonify
 from flask_cors import CORS
 import os
 import cv2
+import time
 import numpy as np
-from werkzeug.utils import secure_filename
 import sys
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.predict import BanglaOCRPredictor
+from src.registry import ModelRegistry, ModelUnavailable
+from src.batching import MicroBatcher, QueueFullError
+from src.utils import load_image
 from config import Config
 
 app = Flask(__name__)
 CORS(app)
 
 # Configuration
-UPLOAD_FOLDER = 'app/static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp'}
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Load model (update path to your trained model)
-MODEL_PATH = os.path.join(Config.MODEL_DIR, 'bangla_ocr_best.h5')
-predictor = None
+batcher = None
 
-if os.path.exists(MODEL_PATH):
-    predictor = BanglaOCRPredictor(MODEL_PATH)
-    print("Model loaded successfully!")
-else:
-    print(f"Warning: Model not found at {MODEL_PATH}")
-    print("Please train the model first or update MODEL_PATH")
+# Models in Config.MODEL_DIR are loaded and warmed up on background threads
+# (TensorFlow included); /health reports 'loading' until one is ready
+registry = ModelRegistry().start()
+
+def predict_images(items):
+    """Predict (predictor, image) pairs, one batch per model version"""
+    results = [None] * len(items)
+    groups = {}
+    for i, (predictor, image) in enumerate(items):
+        groups.setdefault(id(predictor), (predictor, []))[1].append(i)
+    
+    for predictor, positions in groups.values():
+        images = [items[i][1] for i in positions]
+        if Config.SEGMENT_LINES:
+            texts = predictor.predict_paragraphs(images)
+        else:
+            texts = predictor.predict_batch(images)
+        for i, text in zip(positions, texts):
+            results[i] = text
+    return results
+
+def unavailable(e, pinned=False):
+    if e.status == 'missing' and pinned:
+        return jsonify({'error': str(e), 'status': e.status}), 404
+    headers = {'Retry-After': '5'} if e.status == 'loading' else {}
+    return jsonify({'error': str(e), 'status': e.status}), 503, headers
+
+def start_batcher():
+    """Route /predict through a MicroBatcher (serving mode)"""
+    global batcher
+    if batcher is None:
+        batcher = MicroBatcher(predict_images)
+    return batcher
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -43,8 +67,8 @@ def index():
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    if predictor is None:
-        return jsonify({'error': 'Model not loaded. Please train the model first.'}), 500
+    # Optional model version pin, e.g. model=bangla_ocr_20240101_120000_final.h5
+    pinned = request.form.get('model') or request.args.get('model')
     
     if 'image' not in request.files:
         return jsonify({'error': 'No image provided'}), 400
@@ -55,33 +79,82 @@ def predict():
         return jsonify({'error': 'No file selected'}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        # Decode straight from the request stream, nothing touches the disk
+        image = load_image(file.stream.read())
+        if image is None:
+            return jsonify({'error': 'Could not decode image'}), 400
         
         try:
-            # Predict
-            result = predictor.predict_image(filepath)
-            
-            # Clean up
-            os.remove(filepath)
-            
-            return jsonify({
-                'success': True,
-                'text': result
-            })
-        
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+            with registry.acquire(pinned) as (version, predictor):
+                return run_prediction(predictor, image, version)
+        except ModelUnavailable as e:
+            return unavailable(e, pinned=bool(pinned))
     
     return jsonify({'error': 'Invalid file type'}), 400
 
+def run_prediction(predictor, image, version):
+    try:
+        if batcher is not None:
+            output = batcher.predict((predictor, image))
+            result = output['result']
+            timings = {
+                'queue_wait_ms': round(output['queue_wait'] * 1000, 2),
+                'inference_ms': round(output['inference'] * 1000, 2),
+                'batch_size': output['batch_size'],
+            }
+        else:
+            start = time.perf_counter()
+            result = predict_images([(predictor, image)])[0]
+            timings = {
+                'queue_wait_ms': 0.0,
+                'inference_ms': round((time.perf_counter() - start) * 1000, 2),
+                'batch_size': 1,
+            }
+        
+        return jsonify({
+            'success': True,
+            'text': result,
+            'timings': timings,
+            'model_version': version
+        })
+    
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/health')
 def health():
     return jsonify({
-        'status': 'ok',
-        'model_loaded': predictor is not None
+        **registry.health(),
+        'batching': None if batcher is None else {
+            **batcher.stats(),
+            'queue_size': batcher.queue.qsize(),
+        }
+    }), 200 if registry.status() == 'ready' else 503
+
+@app.route('/models')
+def models():
+    return jsonify({
+        'available': sorted(registry.available()),
+        'active_version': registry.active,
     })
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Bangla OCR web app")
+    parser.add_argument('--serve', action='store_true',
+                        help="production mode: no debug, threaded server, micro-batched inference")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+    
+    if not args.serve:
+        app.run(debug=True, host=args.host, port=args.port)
+    else:
+        start_batcher()
+        try:
+            from waitress import serve
+            serve(app, host=args.host, port=args.port, threads=Config.SERVE_THREADS)
+        except ImportError:
+            app.run(host=args.host, port=args.port, threaded=True)
\ No newline at end of file
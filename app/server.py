@@ -0,0 +1,228 @@
+"""
+Async (ASGI) inference server with the same /predict and /health contract as app.py
+Inference runs in a dedicated executor behind a bounded queue; when it is
+full requests get 429 instead of waiting, and requests that wait too long get 503.
+
+    pip install starlette uvicorn python-multipart
+    python app/server.py
+"""
+
+import os
+import sys
+import json
+import asyncio
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from src.registry import ModelRegistry, ModelUnavailable
+from src.segmentation import segment_lines
+from src.utils import load_image
+from config import Config
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp'}
+
+class Saturated(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class InferenceExecutor:
+    """Runs blocking predictor calls off the event loop, with admission control
+    
+    At most `queue_depth` requests may be in flight (running or waiting for
+    a worker); further requests are rejected immediately with 429. A request
+    still waiting for a worker after `timeout` seconds is dropped with 503.
+    """
+    
+    def __init__(self, workers=None, queue_depth=None, timeout=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers or Config.ASYNC_WORKERS,
+                                           thread_name_prefix='inference')
+        self.queue_depth = queue_depth or Config.ASYNC_QUEUE_DEPTH
+        self.timeout = timeout or Config.ASYNC_QUEUE_TIMEOUT
+        self.pending = 0
+        self.stats = {'completed': 0, 'rejected': 0, 'timed_out': 0}
+    
+    def acquire(self):
+        # Only touched from the event loop thread, so no lock is needed
+        if self.pending >= self.queue_depth:
+            self.stats['rejected'] += 1
+            raise Saturated(429, f"Server busy ({self.pending} requests in flight)")
+        self.pending += 1
+    
+    def release(self):
+        self.pending -= 1
+    
+    async def run(self, fn, *args):
+        job = self.executor.submit(fn, *args)
+        future = asyncio.wrap_future(job)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            # Only give up on calls still waiting for a worker; a running
+            # call is allowed to finish
+            if job.cancel():
+                self.stats['timed_out'] += 1
+                raise Saturated(503, f"Inference queue wait exceeded {self.timeout}s")
+            result = await future
+        self.stats['completed'] += 1
+        return result
+
+class HeldStreamingResponse(StreamingResponse):
+    """StreamingResponse that calls `release` once it is finished or abandoned
+    
+    A generator's own finally never runs if the client disconnects before
+    the first chunk is pulled, so resources held for the stream are freed here.
+    """
+    
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                self.release()
+
+executor = InferenceExecutor()
+registry = ModelRegistry().start()
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def error(message, status, retry_after=False, **extra):
+    headers = {'Retry-After': str(Config.ASYNC_RETRY_AFTER)} if retry_after else None
+    return JSONResponse({'error': message, **extra}, status_code=status, headers=headers)
+
+def unavailable(e, pinned=False):
+    if e.status == 'missing' and pinned:
+        return error(str(e), 404, status=e.status)
+    return error(str(e), 503, retry_after=e.status == 'loading', status=e.status)
+
+async def read_upload(request):
+    """(decoded grayscale upload, pinned model version or None, error response)"""
+    form = await request.form()
+    pinned = form.get('model') or request.query_params.get('model')
+    file = form.get('image')
+    if file is None or not hasattr(file, 'filename'):
+        return None, pinned, error('No image provided', 400)
+    if file.filename == '':
+        return None, pinned, error('No file selected', 400)
+    if not allowed_file(file.filename):
+        return None, pinned, error('Invalid file type', 400)
+    
+    image = load_image(await file.read())
+    if image is None:
+        return None, pinned, error('Could not decode image', 400)
+    return image, pinned, None
+
+def predict_one(predictor, image):
+    if Config.SEGMENT_LINES:
+        return predictor.predict_paragraph(image)
+    return predictor.predict_image(image)
+
+async def predict(request):
+    image, pinned, response = await read_upload(request)
+    if response is not None:
+        return response
+    
+    try:
+        executor.acquire()
+    except Saturated as e:
+        return error(str(e), e.status, retry_after=True)
+    
+    try:
+        with registry.acquire(pinned) as (version, predictor):
+            result = await executor.run(predict_one, predictor, image)
+        return JSONResponse({'success': True, 'text': result, 'model_version': version})
+    except ModelUnavailable as e:
+        return unavailable(e, pinned=bool(pinned))
+    except Saturated as e:
+        return error(str(e), e.status, retry_after=True)
+    except Exception as e:
+        return error(str(e), 500)
+    finally:
+        executor.release()
+
+async def predict_stream(request):
+    """Newline-delimited JSON, one object per text line as soon as its batch is decoded"""
+    image, pinned, response = await read_upload(request)
+    if response is not None:
+        return response
+    
+    try:
+        executor.acquire()
+    except Saturated as e:
+        return error(str(e), e.status, retry_after=True)
+    
+    # The queue slot and the model are held until the last line has been sent
+    model = ExitStack()
+    try:
+        version, predictor = model.enter_context(registry.acquire(pinned))
+    except ModelUnavailable as e:
+        executor.release()
+        return unavailable(e, pinned=bool(pinned))
+    
+    async def lines():
+        try:
+            crops = await executor.run(segment_lines, image)
+            yield json.dumps({'lines': len(crops), 'model_version': version}) + '\n'
+            # One forward pass per batch of lines; lines are still sent as each batch finishes
+            batch_size = Config.PREDICT_BATCH_SIZE
+            for start in range(0, len(crops), batch_size):
+                texts = await executor.run(predictor.predict_batch, crops[start:start + batch_size], batch_size)
+                for i, text in enumerate(texts, start):
+                    yield json.dumps({'line': i, 'text': text}, ensure_ascii=False) + '\n'
+        except Saturated as e:
+            yield json.dumps({'error': str(e), 'status': e.status}) + '\n'
+        except Exception as e:
+            yield json.dumps({'error': str(e), 'status': 500}) + '\n'
+    
+    def release():
+        model.close()
+        executor.release()
+    
+    return HeldStreamingResponse(lines(), release, media_type='application/x-ndjson')
+
+async def health(request):
+    return JSONResponse({
+        **registry.health(),
+        'inference': {
+            **executor.stats,
+            'in_flight': executor.pending,
+            'queue_depth': executor.queue_depth,
+        }
+    }, status_code=200 if registry.status() == 'ready' else 503)
+
+async def models(request):
+    return JSONResponse({
+        'available': sorted(registry.available()),
+        'active_version': registry.active,
+    })
+
+app = Starlette(routes=[
+    Route('/predict', predict, methods=['POST']),
+    Route('/predict/stream', predict_stream, methods=['POST']),
+    Route('/health', health),
+    Route('/models', models),
+])
+
+if __name__ == '__main__':
+    import argparse
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Async Bangla OCR inference server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -16,6 +16,28 @@ class Config:
     EPOCHS = 100
     LEARNING_RATE = 0.0001
     MAX_TEXT_LENGTH = 128
+    PREDICT_BATCH_SIZE = 32
+    MODEL_VARIANT = 'crnn'  # see MODEL_VARIANTS in src/model.py
+    TIME_STEPS = None  # pool the time axis down to this many steps (None = IMG_WIDTH // 8)
+    INFERENCE_THREADS = None  # intra-op threads for every backend (None = runtime default)
+    
+    # Prediction result cache keyed by image content + model version (src/cache.py)
+    USE_RESULT_CACHE = False
+    RESULT_CACHE_SIZE = 1024  # in-memory LRU entries
+    RESULT_CACHE_DB = None  # SQLite file for a persistent tier, None = memory only
+    
+    # 'stretch' resizes every image to IMG_WIDTH; 'bucket' keeps the aspect
+    # ratio and pads to the nearest width bucket (needs a model trained in
+    # bucket mode, which accepts variable widths)
+    RESIZE_MODE = 'stretch'
+    WIDTH_BUCKETS = (128, 256, 512, 1024)
+    
+    # CTC decoding: 'greedy' or 'beam' (prefix beam search, src/decoder.py)
+    DECODER = 'greedy'
+    BEAM_WIDTH = 10
+    BEAM_PRUNE_THRESHOLD = 1e-3
+    LM_ORDER = 0  # character n-gram LM from train annotations; 0 disables
+    LM_WEIGHT = 0.5
     
     # Bangla characters
     CHARACTERS = (
@@ -34,6 +56,65 @@ class Config:
     EARLY_STOPPING_PATIENCE = 15
     REDUCE_LR_PATIENCE = 7
     USE_AUGMENTATION = True
+    MIXED_PRECISION = None  # None, 'mixed_bfloat16' (CPU) or 'mixed_float16' (GPU)
+    # jit_compile the training step. Rejected by train_model: TensorFlow 2.15's CTC
+    # loss uses InplaceAdd, which has no XLA kernel (see scripts/benchmark_train_step.py)
+    XLA_JIT = False
+    USE_TF_DATA = False  # tf.data input pipeline instead of DataGenerator
+    TF_DATA_CACHE = None  # None, 'memory' or a directory for cache files
+    USE_COMPILED_DATASET = False  # read batches from scripts/compile_dataset.py output
+    COMPILED_DIR_NAME = 'compiled'
+    DATA_WORKERS = 0  # worker processes building DataGenerator batches
+    PREFETCH_BATCHES = 4
+    DATA_SEED = 42  # shuffling and augmentation seed
+    
+    # Profiling (python src/train.py --profile / --profile-input)
+    PROFILE_TRAINING = False
+    PROFILE_BATCHES = (10, 20)  # steps captured in the TensorBoard trace
+    LOG_DIR = os.path.join(BASE_DIR, 'logs')
+    
+    # Line segmentation (paragraph images): split pages into lines before
+    # recognition. Off by default so full-image models keep their behavior
+    SEGMENT_LINES = False
+    LINE_PROFILE_THRESHOLD = 0.02  # fraction of the densest row
+    LINE_MIN_HEIGHT = 10
+    LINE_MIN_GAP = 3
+    LINE_MARGIN = 4
+    
+    # Labeling tool (scripts/label_tool.py): edits go to data/<split>/annotations.db
+    # and are exported to annotations.json this often
+    LABEL_EXPORT_SECONDS = 60
+    LABEL_PREVIEW_WIDTH = 1600  # previews and line crops are downscaled to this width
+    LABEL_PREVIEW_FORMAT = 'webp'  # 'webp' or 'jpeg'
+    LABEL_PREVIEW_QUALITY = 80
+    LABEL_PREVIEW_CACHE_MB = 1024  # least recently used previews are deleted beyond this; None = no limit
+    LABEL_PREFETCH = 5  # upcoming items rendered ahead and prefetched by the page
+    LABEL_PRELABEL_IDLE_SECONDS = 5  # pre-labeling worker poll interval once everything is predicted
+    
+    # Web app startup: the model loads in the background and /health
+    # reports 'loading' until WARMUP_RUNS dummy batches per width have run
+    WARMUP_RUNS = 2
+    
+    # Model registry over MODEL_DIR (src/registry.py). MODEL_VERSION is a file
+    # name such as 'bangla_ocr_20240101_120000_best.h5'; None serves the newest
+    # file matching REGISTRY_MODEL_GLOB and switches to newer ones as they appear
+    MODEL_VERSION = None
+    REGISTRY_MODEL_GLOB = '*_final.h5'  # full-precision final checkpoints only
+    REGISTRY_MAX_MODELS = 2  # loaded models kept in memory
+    REGISTRY_POLL_SECONDS = 30  # 0 disables hot reload
+    REGISTRY_SETTLE_SECONDS = 5  # ignore files modified more recently (still being written)
+    
+    # Web app serving mode (python app/app.py --serve)
+    SERVE_BATCH_WINDOW_MS = 10  # how long the batcher waits to fill a batch
+    SERVE_MAX_BATCH_SIZE = 16
+    SERVE_QUEUE_DEPTH = 256  # pending requests before /predict returns 503
+    SERVE_THREADS = 16
+    
+    # Async server (python app/server.py)
+    ASYNC_WORKERS = 1  # inference threads; TFLite interpreters are not thread-safe
+    ASYNC_QUEUE_DEPTH = 32  # requests in flight before /predict returns 429
+    ASYNC_QUEUE_TIMEOUT = 30  # seconds a request may wait for a worker before 503
+    ASYNC_RETRY_AFTER = 1  # Retry-After header value (seconds)
 
 os.makedirs(Config.MODEL_DIR, exist_ok=True)
 os.makedirs(Config.TRAIN_DIR, exist_ok=True)
@@ -1,12 +1,29 @@
+"""
+Download BanglaWriting from Kaggle and ingest it into data/{train,val,test}
+
+Sidecar JSONs are parsed and images copied (or hardlinked / reflinked, or
+resized to the training resolution) in a thread pool while RAW_DIR is still
+being walked. Every ingested file is appended to a manifest as soon as it is
+done, so re-runs (and runs after a crash) only process files that are new or
+whose content hash changed; annotations.json is written from the manifest.
+
+Usage: python kaggle_prepare_data.py [--skip-download] [--workers 8]
+           [--link copy|hardlink|reflink] [--resize]
+"""
+
 import os
 import json
-import random
-import shutil
+import time
+import hashlib
+import argparse
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 DATASET = "reasat/banglawriting"
 RAW_DIR = "raw_data"
 OUTPUT_DIR = "data"
+MANIFEST = os.path.join(OUTPUT_DIR, ".ingest_manifest.jsonl")
 
 IMAGE_EXTS = (".jpg", ".jpeg", ".png")
 
@@ -16,7 +33,7 @@ SPLITS = {
     "test": 0.1
 }
 
-random.seed(42)
+FICLONE = 0x40049409  # Linux ioctl: share extents with the source (btrfs, xfs)
 
 
 def download_dataset():
@@ -48,48 +65,253 @@ def extract_text_from_json(meta: dict) -> str:
     return ""
 
 
-def collect_samples():
-    samples = []
-    scanned = 0
-
+def scan_sources():
+    """Yield (source, image path, json path) while walking RAW_DIR"""
     for root, _, files in os.walk(RAW_DIR):
         for file in files:
             if not file.lower().endswith(IMAGE_EXTS):
                 continue
 
-            scanned += 1
             img_path = os.path.join(root, file)
             json_path = os.path.join(root, os.path.splitext(file)[0] + ".json")
-
-            if not os.path.exists(json_path):
+            yield os.path.relpath(img_path, RAW_DIR), img_path, json_path
+
+
+def assign_split(digest: str) -> str:
+    """Split from the content hash: stable across runs and independent of walk order"""
+    point = int(digest[:8], 16) / 2 ** 32
+    cumulative = 0.0
+    for split, fraction in SPLITS.items():
+        cumulative += fraction
+        if point < cumulative:
+            return split
+    return split
+
+
+def file_stat(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def link_file(src: str, dst: str, mode: str, data: bytes):
+    """Place `src` at `dst` by copy, hardlink or reflink; falls back to a copy"""
+    if mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass  # other filesystem
+    elif mode == "reflink":
+        try:
+            import fcntl  # POSIX only
+            with open(src, "rb") as s, open(dst, "wb") as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            return
+        except (ImportError, OSError):
+            pass  # Windows, or a filesystem without reflinks
+
+    with open(dst, "wb") as f:
+        f.write(data)
+
+
+def resize_to_training(data: bytes, dst: str):
+    """Grayscale, resized exactly as the data pipeline does, saved as PNG"""
+    import cv2
+    from src.utils import decode_image, resize_image
+
+    img = decode_image(data)
+    if img is None:
+        raise ValueError("unreadable image")
+    ok, encoded = cv2.imencode(".png", resize_image(img))
+    if not ok:
+        raise ValueError("could not encode image")
+    with open(dst, "wb") as f:
+        f.write(encoded.tobytes())
+
+
+class Ingestor:
+    def __init__(self, workers=8, link="copy", resize=False):
+        self.workers = workers
+        self.link = link
+        self.resize = resize
+        self.variant = resize_signature() if resize else link
+        self.manifest = load_manifest()
+        self.lock = threading.Lock()
+        # (split, image name) -> source, so different sources never share an output file
+        self.claimed = {(e["split"], e["image"]): source for source, e in self.manifest.items()}
+        self.counts = {"new": 0, "changed": 0, "updated": 0, "unchanged": 0, "skipped": 0, "removed": 0}
+
+    def output_name(self, split: str, source: str, digest: str) -> str:
+        stem, ext = os.path.splitext(os.path.basename(source))
+        if self.resize:
+            ext = ".png"
+        with self.lock:
+            name = stem + ext
+            if self.claimed.get((split, name), source) != source:
+                name = f"{stem}_{digest[:8]}{ext}"
+            self.claimed[(split, name)] = source
+        return name
+
+    def process(self, source: str, img_path: str, json_path: str):
+        """Ingest one sample; returns (source, outcome, manifest entry or None)"""
+        previous = self.manifest.get(source)
+        try:
+            img_stat, json_stat = file_stat(img_path), file_stat(json_path)
+        except FileNotFoundError:
+            return source, "skipped", None
+
+        if (previous and previous["image_stat"] == img_stat and previous["json_stat"] == json_stat
+                and previous["variant"] == self.variant
+                and os.path.exists(os.path.join(OUTPUT_DIR, previous["split"], previous["image"]))):
+            return source, "unchanged", previous
+
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                text = extract_text_from_json(json.load(f))
+        except Exception:
+            return source, "skipped", None
+        if not text:
+            return source, "skipped", None
+
+        try:
+            with open(img_path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            print(f" Skipping {source}: {e}")
+            return source, "skipped", None
+        digest = hashlib.sha256(data).hexdigest()
+
+        entry = {"source": source, "image_stat": img_stat, "json_stat": json_stat,
+                 "hash": digest, "variant": self.variant, "text": text}
+        if previous:
+            entry["split"], entry["image"] = previous["split"], previous["image"]
+            dst = os.path.join(OUTPUT_DIR, entry["split"], entry["image"])
+            if previous["hash"] == digest and previous["variant"] == self.variant and os.path.exists(dst):
+                # Same pixels: only the label (or the file's mtime) changed
+                return source, ("updated" if previous["text"] != text else "unchanged"), entry
+            outcome = "changed"
+        else:
+            entry["split"] = assign_split(digest)
+            outcome = "new"
+        if not previous or previous["variant"] != self.variant:
+            entry["image"] = self.output_name(entry["split"], source, digest)
+
+        dst = os.path.join(OUTPUT_DIR, entry["split"], entry["image"])
+        try:
+            # Never write through an old hardlink into the raw file
+            if os.path.exists(dst):
+                os.remove(dst)
+            if self.resize:
+                resize_to_training(data, dst)
+            else:
+                link_file(img_path, dst, self.link, data)
+        except (OSError, ValueError) as e:
+            print(f" Skipping {source}: {e}")
+            return source, "skipped", None
+
+        if previous and previous["image"] != entry["image"]:
+            remove_output(previous)
+        return source, outcome, entry
+
+    def run(self):
+        start = time.perf_counter()
+        seen = set()
+
+        # Bounded window of in-flight samples: the walk, the parsing and the
+        # copies overlap without queueing the whole dataset in memory
+        with ThreadPoolExecutor(self.workers) as pool, open(MANIFEST, "a", encoding="utf-8") as log:
+            pending = set()
+            for source, img_path, json_path in scan_sources():
+                seen.add(source)
+                pending.add(pool.submit(self.process, source, img_path, json_path))
+                if len(pending) >= self.workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self.record(done, log)
+            self.record(pending, log)
+
+        for source in set(self.manifest) - seen:
+            remove_output(self.manifest.pop(source))
+            self.counts["removed"] += 1
+
+        write_manifest(self.manifest)
+        elapsed = time.perf_counter() - start
+        scanned = len(seen)
+        print(f" Images scanned: {scanned} in {elapsed:.1f}s ({scanned / max(elapsed, 1e-9):.0f} files/s)")
+        print(" " + ", ".join(f"{name}: {count}" for name, count in self.counts.items()))
+        return self.manifest
+
+    def record(self, futures, log):
+        """Log finished samples to the manifest right away"""
+        for future in futures:
+            source, outcome, entry = future.result()
+            self.counts[outcome] += 1
+            if entry is None:
+                if source in self.manifest:
+                    # No longer a valid sample (e.g. its label was removed)
+                    remove_output(self.manifest.pop(source))
+                    log.write(json.dumps({"source": source, "deleted": True}) + "\n")
+                    log.flush()
                 continue
+            if outcome != "unchanged" or entry is not self.manifest.get(entry["source"]):
+                log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                log.flush()
+            self.manifest[entry["source"]] = entry
 
-            try:
-                with open(json_path, "r", encoding="utf-8") as f:
-                    meta = json.load(f)
-            except Exception:
-                continue
 
-            text = extract_text_from_json(meta)
-            if not text:
-                continue
+def resize_signature() -> str:
+    from config import Config
+    return f"resize:{Config.RESIZE_MODE}:{Config.IMG_HEIGHT}x{Config.IMG_WIDTH}:{Config.WIDTH_BUCKETS}"
 
-            samples.append({
-                "image_path": img_path,
-                "image_name": file,
-                "text": text
-            })
 
-    print(f" Images scanned: {scanned}")
-    print(f" Valid samples found: {len(samples)}")
+def remove_output(entry: dict):
+    path = os.path.join(OUTPUT_DIR, entry["split"], entry["image"])
+    if os.path.exists(path):
+        os.remove(path)
 
-    if not samples:
-        raise RuntimeError(
-            " No valid image-json pairs found.\n"
-            " JSON uses shapes[].label (check dataset integrity)."
-        )
 
-    return samples
+def load_manifest() -> dict:
+    """source -> entry; later lines of the append-only log win"""
+    manifest = {}
+    if not os.path.exists(MANIFEST):
+        return manifest
+    with open(MANIFEST, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # last line cut off by an interrupted run
+            if entry.get("deleted"):
+                manifest.pop(entry["source"], None)
+            else:
+                manifest[entry["source"]] = entry
+    return manifest
+
+
+def write_manifest(manifest: dict):
+    """Compact the manifest log to one line per source"""
+    tmp_path = MANIFEST + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in manifest.values():
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, MANIFEST)
+
+
+def write_annotations(manifest: dict):
+    split_data = {split: [] for split in SPLITS}
+    for entry in manifest.values():
+        split_data[entry["split"]].append({
+            "image": entry["image"],
+            "text": entry["text"]
+        })
+
+    for split, annotations in split_data.items():
+        annotations.sort(key=lambda item: item["image"])
+        ann_file = os.path.join(OUTPUT_DIR, split, "annotations.json")
+        with open(ann_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(annotations, f, ensure_ascii=False, indent=2)
+        os.replace(ann_file + ".tmp", ann_file)
+
+        print(f" {split}: {len(annotations)} samples")
 
 
 def prepare_folders():
@@ -98,41 +320,35 @@ def prepare_folders():
 
 
 def main():
-    download_dataset()
+    parser = argparse.ArgumentParser(description="Prepare the BanglaWriting dataset")
+    parser.add_argument("--skip-download", action="store_true", help="use what is already in RAW_DIR")
+    parser.add_argument("--workers", type=int, default=8, help="threads parsing and copying files")
+    parser.add_argument("--link", choices=["copy", "hardlink", "reflink"], default="copy",
+                        help="how originals are placed in data/ (falls back to copy)")
+    parser.add_argument("--resize", action="store_true",
+                        help="store grayscale images already resized to the training resolution "
+                             "instead of the originals (not with SEGMENT_LINES)")
+    args = parser.parse_args()
+
+    if args.resize:
+        from config import Config
+        if Config.SEGMENT_LINES:
+            # Resized copies replace the originals in data/, and line
+            # segmentation needs the full-resolution pages
+            parser.error("--resize cannot be used with Config.SEGMENT_LINES enabled")
+
+    if not args.skip_download:
+        download_dataset()
     prepare_folders()
 
-    samples = collect_samples()
-    random.shuffle(samples)
-
-    total = len(samples)
-    train_end = int(total * SPLITS["train"])
-    val_end = train_end + int(total * SPLITS["val"])
-
-    split_data = {
-        "train": samples[:train_end],
-        "val": samples[train_end:val_end],
-        "test": samples[val_end:]
-    }
-
-    for split, items in split_data.items():
-        split_dir = os.path.join(OUTPUT_DIR, split)
-        annotations = []
-
-        for item in items:
-            shutil.copy(item["image_path"], os.path.join(split_dir, item["image_name"]))
-            annotations.append({
-                "image": item["image_name"],
-                "text": item["text"]
-            })
-
-        with open(
-            os.path.join(split_dir, "annotations.json"),
-            "w",
-            encoding="utf-8"
-        ) as f:
-            json.dump(annotations, f, ensure_ascii=False, indent=2)
+    manifest = Ingestor(args.workers, args.link, args.resize).run()
+    if not manifest:
+        raise RuntimeError(
+            " No valid image-json pairs found.\n"
+            " JSON uses shapes[].label (check dataset integrity)."
+        )
 
-        print(f" {split}: {len(items)} samples")
+    write_annotations(manifest)
 
     print("\n Dataset preparation completed successfully!")
 
@@ -2,65 +2,163 @@
 Auto-label using EasyOCR (Easiest!)
 Requires: pip install easyocr
 Works out of the box, no API keys needed
+
+Images are split across a pool of worker processes, each with its own
+easyocr.Reader. Every result is appended to annotations.autolabel.jsonl
+next to annotations.json as soon as it is ready, so an interrupted run
+picks up where it stopped; the checkpoint is merged into annotations.json
+once a split is complete. Items that already have a label are skipped
+unless --relabel is given.
+Usage: python scripts/auto_label_easyocr.py [--workers 4] [--splits train val] [--gpu]
 """
 
-import json
+import sys
 from pathlib import Path
-import easyocr
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+import json
+import time
+import argparse
+import multiprocessing
 from tqdm import tqdm
+from config import Config
+from src.annotation_store import is_labeled
+
+CHECKPOINT_NAME = 'annotations.autolabel.jsonl'
+
+reader = None
+init_error = None
+
+def init_worker(gpu, threads):
+    """One EasyOCR reader per worker process"""
+    global reader, init_error
+    try:
+        import torch
+        import easyocr
+        torch.set_num_threads(threads)
+        reader = easyocr.Reader(['bn'], gpu=gpu, verbose=False)  # 'bn' = Bengali
+    except Exception as e:
+        # Raising here would make the pool respawn the worker forever;
+        # label_image() reports it to the parent instead
+        init_error = f"EasyOCR failed to start in worker {os.getpid()}: {e}"
+
+def label_image(task):
+    """(image, text) for one (image, path) task"""
+    if init_error is not None:
+        raise RuntimeError(init_error)
+    image, img_path = task
+    try:
+        # OCR
+        results = reader.readtext(img_path)
+        
+        # Combine all detected text
+        text = ' '.join([result[1] for result in results]).strip()
+        return image, text or "NO_TEXT_DETECTED"
+    except Exception as e:
+        print(f"Error with {img_path}: {e}")
+        return image, "ERROR"
+
+def needs_label(item, relabel=False):
+    return relabel or not is_labeled(item['text']) or item['text'] == "ERROR"
+
+def load_checkpoint(checkpoint):
+    """{image: text} of results saved by an earlier, interrupted run; failed images are left out to be retried"""
+    done = {}
+    if not checkpoint.exists():
+        return done
+    with open(checkpoint, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # last line cut off by the crash
+            if entry['text'] == "ERROR":
+                done.pop(entry['image'], None)
+            else:
+                done[entry['image']] = entry['text']
+    return done
+
+def merge_checkpoint(ann_file, annotations, done):
+    for item in annotations:
+        if item['image'] in done:
+            item['text'] = done[item['image']]
+    
+    tmp_file = ann_file.with_suffix('.json.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(annotations, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, ann_file)
 
-def auto_label_with_easyocr():
+def auto_label_split(split_dir, pool, relabel=False):
+    """Label one split with `pool`; returns the number of images processed in this run"""
+    ann_file = split_dir / 'annotations.json'
+    checkpoint = split_dir / CHECKPOINT_NAME
+    
+    with open(ann_file, 'r', encoding='utf-8') as f:
+        annotations = json.load(f)
+    
+    done = load_checkpoint(checkpoint)
+    todo = [(item['image'], str(split_dir / item['image'])) for item in annotations
+            if item['image'] not in done and needs_label(item, relabel)]
+    print(f"   {len(annotations)} images, {len(done)} from checkpoint, {len(todo)} to label")
+    
+    start = time.perf_counter()
+    if todo:
+        with open(checkpoint, 'a', encoding='utf-8') as f:
+            # tqdm shows images/sec and the ETA as results arrive
+            for image, text in tqdm(pool.imap_unordered(label_image, todo, chunksize=4),
+                                    total=len(todo), unit='img'):
+                f.write(json.dumps({'image': image, 'text': text}, ensure_ascii=False) + '\n')
+                f.flush()
+                done[image] = text
+    elapsed = time.perf_counter() - start
+    
+    merge_checkpoint(ann_file, annotations, done)
+    checkpoint.unlink(missing_ok=True)
+    
+    if todo:
+        print(f"✓ Labeled {len(todo)} images in {elapsed:.1f}s ({len(todo) / elapsed:.2f} img/s)")
+    return len(todo)
+
+def auto_label_with_easyocr(splits=('train', 'val', 'test'), workers=1, gpu=False, relabel=False):
     """Auto-label using EasyOCR"""
     
-    print("Initializing EasyOCR (first time takes a while)...")
-    reader = easyocr.Reader(['bn'], gpu=False)  # 'bn' = Bengali
+    data_dir = Path(Config.DATA_DIR)
+    split_dirs = [data_dir / split for split in splits if (data_dir / split / 'annotations.json').exists()]
+    if not split_dirs:
+        print("No annotations.json found")
+        return
     
-    data_dir = Path('data')
+    # Built once here first: the model is downloaded by one process only and
+    # a broken install fails now instead of in every worker. On the CPU, so
+    # this process does not hold a CUDA context while the workers run
+    print("Loading EasyOCR (first time downloads the model)...")
+    import easyocr
+    easyocr.Reader(['bn'], gpu=False, verbose=False)
     
-    for split in ['train', 'val', 'test']:
-        split_dir = data_dir / split
-        ann_file = split_dir / 'annotations.json'
-        
-        if not ann_file.exists():
-            continue
-        
-        print(f"\n📂 Processing {split}...")
-        
-        with open(ann_file, 'r', encoding='utf-8') as f:
-            annotations = json.load(f)
-        
-        for item in tqdm(annotations):
-            img_path = str(split_dir / item['image'])
-            
-            try:
-                # OCR
-                results = reader.readtext(img_path)
-                
-                # Combine all detected text
-                text = ' '.join([result[1] for result in results])
-                
-                if text.strip():
-                    item['text'] = text.strip()
-                else:
-                    item['text'] = "NO_TEXT_DETECTED"
-                    
-            except Exception as e:
-                print(f"Error with {img_path}: {e}")
-                item['text'] = "ERROR"
-        
-        # Save
-        with open(ann_file, 'w', encoding='utf-8') as f:
-            json.dump(annotations, f, ensure_ascii=False, indent=2)
-        
-        print(f"✓ Labeled {len(annotations)} images")
+    print(f"Initializing EasyOCR in {workers} worker(s)...")
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(workers, initializer=init_worker, initargs=(gpu, threads)) as pool:
+        for split_dir in split_dirs:
+            print(f"\n📂 Processing {split_dir.name}...")
+            auto_label_split(split_dir, pool, relabel)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Auto-label images with EasyOCR")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="worker processes, each loading its own EasyOCR model")
+    parser.add_argument('--splits', nargs='+', default=['train', 'val', 'test'])
+    parser.add_argument('--gpu', action='store_true')
+    parser.add_argument('--relabel', action='store_true', help="also overwrite items that already have a label")
+    args = parser.parse_args()
+    
     print("="*70)
     print("🤖 Auto-labeling with EasyOCR")
     print("="*70)
     print()
     
-    auto_label_with_easyocr()
+    auto_label_with_easyocr(args.splits, args.workers, args.gpu, args.relabel)
     
     print("\n✅ Auto-labeling complete!")
-    print("\nNext: python src/train.py")
\ No newline at end of file
+    print("\nNext: python src/train.py")
@@ -0,0 +1,64 @@
+"""
+Microbenchmarks for label encoding and CTC decoding
+Compares the per-character helpers with the vectorized batch versions
+Usage: python scripts/benchmark_codec.py [batch_size] [repeats]
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import timeit
+import numpy as np
+from config import Config
+from src.utils import encode_text, decode_prediction, encode_batch, decode_batch
+
+def random_texts(n, rng):
+    chars = [c for c in Config.CHARACTERS if c != ' ']
+    texts = []
+    for _ in range(n):
+        words = [''.join(rng.choice(chars, rng.randint(2, 8))) for _ in range(rng.randint(3, 12))]
+        texts.append(' '.join(words))
+    return texts
+
+def loop_encode(texts):
+    """Current DataGenerator path: encode_text + np.pad per sample"""
+    labels = []
+    for text in texts:
+        encoded = encode_text(text)[:Config.MAX_TEXT_LENGTH]
+        labels.append(np.pad(encoded, (0, Config.MAX_TEXT_LENGTH - len(encoded)), constant_values=0))
+    return np.array(labels)
+
+def loop_decode(prediction):
+    """Current predictor path: greedy collapse per row + decode_prediction"""
+    texts = []
+    for row in prediction.argmax(axis=-1):
+        collapsed, prev = [], None
+        for idx in row:
+            if idx != prev and idx != Config.NUM_CLASSES - 1:
+                collapsed.append(idx)
+            prev = idx
+        texts.append(decode_prediction(collapsed))
+    return texts
+
+def report(name, baseline, vectorized, repeats):
+    base = min(timeit.repeat(baseline, number=1, repeat=repeats))
+    vec = min(timeit.repeat(vectorized, number=1, repeat=repeats))
+    print(f" {name:<8} loop: {base * 1000:8.2f} ms   vectorized: {vec * 1000:8.2f} ms   speedup: {base / vec:5.1f}x")
+
+def run(batch_size=256, repeats=20):
+    rng = np.random.RandomState(0)
+    texts = random_texts(batch_size, rng)
+    prediction = rng.rand(batch_size, Config.IMG_WIDTH // 8, Config.NUM_CLASSES).astype(np.float32)
+    
+    assert np.array_equal(loop_encode(texts), encode_batch(texts)[0])
+    assert loop_decode(prediction) == decode_batch(prediction)
+    
+    print(f"Batch size: {batch_size}, best of {repeats}")
+    report("encode", lambda: loop_encode(texts), lambda: encode_batch(texts), repeats)
+    report("decode", lambda: loop_decode(prediction), lambda: decode_batch(prediction), repeats)
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    run(batch_size, repeats)
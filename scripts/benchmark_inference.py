@@ -0,0 +1,172 @@
+"""
+Inference benchmark: throughput and latency of BanglaOCRPredictor
+Every (model, thread count) pair runs in a fresh process so load time and
+peak RSS are measured cleanly; batch sizes and image widths are swept inside it.
+Results are written as JSON for comparing runs across commits.
+
+Usage:
+    python scripts/benchmark_inference.py --models models/saved_models/model.h5 model_int8.tflite \\
+        --batch-sizes 1 8 32 --widths 256 512 1024 --threads 1 4 --output bench.json
+    python scripts/benchmark_inference.py --models model.onnx --images data/val
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+import json
+import time
+import platform
+import argparse
+import resource
+import subprocess
+import multiprocessing
+import numpy as np
+from config import Config
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+def synthetic_images(count, width, seed=0):
+    """Grayscale line images: white background with random dark strokes"""
+    import cv2
+    rng = np.random.RandomState(seed)
+    height = Config.IMG_HEIGHT
+    images = []
+    for _ in range(count):
+        img = np.full((height, width), 255, dtype=np.uint8)
+        for _ in range(width // 8):
+            x0, y0 = rng.randint(0, width), rng.randint(height // 4, 3 * height // 4)
+            x1, y1 = x0 + rng.randint(-10, 10), y0 + rng.randint(-15, 15)
+            cv2.line(img, (x0, y0), (x1, y1), int(rng.randint(0, 80)), int(rng.randint(1, 4)))
+        images.append(img)
+    return images
+
+def real_images(image_dir, limit=None):
+    from src.utils import load_image
+    names = sorted(name for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+    images = [load_image(os.path.join(image_dir, name)) for name in names[:limit]]
+    return [img for img in images if img is not None]
+
+def percentiles(latencies):
+    values = np.asarray(latencies) * 1000
+    return {
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p95': round(float(np.percentile(values, 95)), 3),
+        'p99': round(float(np.percentile(values, 99)), 3),
+        'mean': round(float(values.mean()), 3),
+    }
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if platform.system() == 'Darwin' else 1024), 1)
+
+def run_config(model_path, threads, args):
+    """Benchmark one model at one thread count (runs in its own process)"""
+    Config.INFERENCE_THREADS = threads
+    Config.USE_RESULT_CACHE = False
+    from src.predict import BanglaOCRPredictor
+    
+    start = time.perf_counter()
+    predictor = BanglaOCRPredictor(model_path)
+    load_seconds = time.perf_counter() - start
+    
+    if args.images:
+        image_sets = {'real': real_images(args.images, args.count)}
+    else:
+        image_sets = {width: synthetic_images(args.count, width) for width in args.widths}
+    
+    results = []
+    for width, images in image_sets.items():
+        for batch_size in args.batch_sizes:
+            # One untimed pass traces every shape this run will use
+            predictor.predict_batch(images[:batch_size], batch_size=batch_size)
+            
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                for offset in range(0, len(images), batch_size):
+                    chunk = images[offset:offset + batch_size]
+                    call_start = time.perf_counter()
+                    predictor.predict_batch(chunk, batch_size=batch_size)
+                    latencies.append(time.perf_counter() - call_start)
+            elapsed = time.perf_counter() - start
+            
+            results.append({
+                'model': os.path.basename(model_path),
+                'backend': predictor.backend.name,
+                'threads': threads,
+                'batch_size': batch_size,
+                'width': width,
+                'images': len(images) * args.repeats,
+                'images_per_sec': round(len(images) * args.repeats / elapsed, 2),
+                'batch_latency_ms': percentiles(latencies),
+                'load_seconds': round(load_seconds, 3),
+                'import_seconds': round(predictor.load_timings['import'], 3),
+            })
+    
+    for result in results:
+        result['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=Config.BASE_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    if Config.RESIZE_MODE != 'bucket' and not args.images and args.widths != [Config.IMG_WIDTH]:
+        # 'stretch' resizes every input to IMG_WIDTH, so other widths would only time the resize
+        print(f"RESIZE_MODE is '{Config.RESIZE_MODE}': skipping the width sweep, "
+              f"using width {Config.IMG_WIDTH} (set RESIZE_MODE = 'bucket' to sweep widths)")
+        args.widths = [Config.IMG_WIDTH]
+    
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count()},
+        'settings': {'resize_mode': Config.RESIZE_MODE, 'decoder': Config.DECODER,
+                     'img_height': Config.IMG_HEIGHT, 'img_width': Config.IMG_WIDTH},
+        'results': [],
+    }
+    
+    # A fresh process per configuration: thread pools are fixed once a
+    # runtime is initialised, and load time / peak RSS must not carry over
+    ctx = multiprocessing.get_context('spawn')
+    for model_path in args.models:
+        for threads in args.threads:
+            print(f"Benchmarking {os.path.basename(model_path)} with threads={threads} ...")
+            with ctx.Pool(1) as pool:
+                results = pool.apply(run_config, (model_path, threads, args))
+            for result in results:
+                latency = result['batch_latency_ms']
+                print(f"   batch {result['batch_size']:>3}  width {result['width']!s:>5}: "
+                      f"{result['images_per_sec']:8.1f} img/s   p50 {latency['p50']:8.2f} ms   "
+                      f"p99 {latency['p99']:8.2f} ms   rss {result['peak_rss_mb']:.0f} MB")
+            report['results'].extend(results)
+    
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        print(f"\nSaved: {args.output}")
+    else:
+        print(text)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark inference throughput and latency")
+    parser.add_argument('--models', nargs='+', required=True, help=".h5, .tflite or .onnx model files")
+    parser.add_argument('--images', default=None, help="directory of real images (default: synthetic)")
+    parser.add_argument('--count', type=int, default=64, help="images per width (or real images used)")
+    parser.add_argument('--widths', nargs='+', type=int, default=[256, 512, 1024],
+                        help="synthetic image widths (only swept when RESIZE_MODE is 'bucket')")
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--threads', nargs='+', type=lambda v: None if v == 'default' else int(v),
+                        default=[None], help="intra-op thread counts ('default' = runtime default)")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', default=None, help="JSON report path (default: print)")
+    run(parser.parse_args())
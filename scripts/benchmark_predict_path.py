@@ -0,0 +1,60 @@
+"""
+Per-call latency of the Keras inference path
+Compares the old model.predict + ctc_decode path with the compiled
+tf.function signature used by KerasBackend
+Usage: python scripts/benchmark_predict_path.py [model.h5] [repeats]
+"""
+
+import sys
+import os
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import tempfile
+import timeit
+import numpy as np
+import tensorflow as tf
+from config import Config
+from src.model import build_crnn_model
+from src.backends import KerasBackend
+from src.utils import decode_batch
+
+def keras_predict(model, batch):
+    """Previous predict_image path: model.predict + tf ctc_decode"""
+    prediction = model.predict(batch, verbose=0)
+    input_len = np.ones(prediction.shape[0]) * prediction.shape[1]
+    results = tf.keras.backend.ctc_decode(prediction, input_length=input_len, greedy=True)[0][0]
+    return decode_batch(results.numpy(), collapse=False)
+
+def compiled_predict(backend, batch):
+    """Current path: one tf.function call with the greedy collapse in-graph"""
+    return decode_batch(backend.predict_decoded(batch), collapse=False)
+
+def report(name, baseline, compiled, repeats):
+    base = min(timeit.repeat(baseline, number=1, repeat=repeats))
+    comp = min(timeit.repeat(compiled, number=1, repeat=repeats))
+    print(f" {name:<10} model.predict: {base * 1000:8.2f} ms   tf.function: {comp * 1000:8.2f} ms   speedup: {base / comp:5.1f}x")
+
+def run(model_path=None, repeats=50):
+    if model_path is None:
+        # Untrained weights are fine for timing
+        model_path = os.path.join(tempfile.mkdtemp(), 'benchmark.h5')
+        build_crnn_model().save(model_path)
+    
+    backend = KerasBackend(model_path)
+    model = backend.model
+    width = Config.IMG_WIDTH if Config.RESIZE_MODE != 'bucket' else Config.WIDTH_BUCKETS[-1]
+    
+    print(f"Input width: {width}, best of {repeats}")
+    for batch_size in (1, Config.PREDICT_BATCH_SIZE):
+        batch = np.random.RandomState(0).rand(batch_size, Config.IMG_HEIGHT, width, 1).astype(np.float32)
+        
+        # Trace both paths before timing
+        assert keras_predict(model, batch) == compiled_predict(backend, batch)
+        report(f"batch {batch_size}", lambda: keras_predict(model, batch),
+               lambda: compiled_predict(backend, batch), repeats)
+
+if __name__ == "__main__":
+    model_path = sys.argv[1] if len(sys.argv) > 1 else None
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    run(model_path, repeats)
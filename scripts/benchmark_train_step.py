@@ -0,0 +1,70 @@
+"""
+Training step time under each precision / XLA setting
+Every mode runs in a fresh process because the Keras dtype policy is global
+Usage: python scripts/benchmark_train_step.py [--steps 20] [--batch-size 16]
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import time
+import argparse
+import multiprocessing
+import numpy as np
+from config import Config
+
+MODES = [
+    ('float32', False),
+    ('float32', True),
+    ('mixed_bfloat16', False),
+    ('mixed_bfloat16', True),
+    ('mixed_float16', False),
+    ('mixed_float16', True),
+]
+
+def time_steps(policy, xla, batch_size, steps, warmup):
+    import tensorflow as tf
+    from src.model import build_training_model, apply_precision_policy
+    
+    apply_precision_policy(policy)
+    training_model, _ = build_training_model()
+    training_model.compile(optimizer=tf.keras.optimizers.Adam(Config.LEARNING_RATE), jit_compile=xla)
+    
+    rng = np.random.RandomState(0)
+    images = rng.rand(batch_size, Config.IMG_HEIGHT, Config.IMG_WIDTH, 1).astype(np.float32)
+    labels = rng.randint(0, Config.NUM_CLASSES - 1, (batch_size, Config.MAX_TEXT_LENGTH)).astype(np.float32)
+    labels[:, 32:] = 0  # realistic label lengths, shorter than the 64 time steps
+    batch = {'image': images, 'label': labels}
+    
+    for _ in range(warmup):
+        training_model.train_on_batch(batch)
+    
+    start = time.perf_counter()
+    for _ in range(steps):
+        training_model.train_on_batch(batch)
+    return (time.perf_counter() - start) / steps
+
+def run(steps=20, batch_size=16, warmup=3):
+    print(f"Batch size: {batch_size}, {steps} steps after {warmup} warm-up steps")
+    ctx = multiprocessing.get_context('spawn')
+    baseline = None
+    for policy, xla in MODES:
+        name = f"{policy}{' + XLA' if xla else ''}"
+        try:
+            with ctx.Pool(1) as pool:
+                step = pool.apply(time_steps, (policy, xla, batch_size, steps, warmup))
+        except Exception as e:
+            print(f" {name:<22} failed: {e}")
+            continue
+        
+        baseline = baseline or step
+        print(f" {name:<22} {step * 1000:8.1f} ms/step   speedup: {baseline / step:4.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare training step time across precision / XLA modes")
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=Config.BATCH_SIZE)
+    parser.add_argument('--warmup', type=int, default=3)
+    args = parser.parse_args()
+    run(args.steps, args.batch_size, args.warmup)
@@ -0,0 +1,112 @@
+"""
+Compare CRNN backbone variants (src/model.py MODEL_VARIANTS)
+Reports parameter count, FLOPs and CPU latency per variant, plus
+validation CER for variants that have a trained model
+Usage: python scripts/benchmark_variants.py [--variants crnn separable_gru]
+           [--weights separable_gru=models/saved_models/x_final.h5] [--repeats 20]
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+from config import Config
+from src.model import MODEL_VARIANTS, build_crnn_model, time_pool_factor
+
+# Gate matrices per recurrent cell
+RECURRENT_GATES = {'LSTM': 4, 'GRU': 3}
+
+def recurrent_flops(model, width):
+    """Float ops of the LSTM/GRU layers at batch size 1, from their shapes
+    
+    Per time step and direction a cell multiplies [input, state, 1] by each
+    gate's weights: 2 * gates * (input + units + 1) * units.
+    """
+    steps = width // 8 // time_pool_factor()
+    total = 0
+    for layer in model.layers:
+        directions = 1
+        if isinstance(layer, tf.keras.layers.Bidirectional):
+            layer, directions = layer.forward_layer, 2
+        gates = RECURRENT_GATES.get(type(layer).__name__)
+        if gates:
+            inputs = layer.cell.kernel.shape[0]
+            total += 2 * gates * (inputs + layer.units + 1) * layer.units * steps * directions
+    return total
+
+def count_flops(model, width):
+    """Float ops of one forward pass at batch size 1
+    
+    Recurrent heads run in a while loop that the graph profiler does not
+    count, so their ops are added from recurrent_flops().
+    """
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+    
+    spec = tf.TensorSpec((1, Config.IMG_HEIGHT, width, 1), tf.float32)
+    concrete = tf.function(lambda image: model(image, training=False)).get_concrete_function(spec)
+    frozen = convert_variables_to_constants_v2(concrete)
+    options = tf.compat.v1.profiler.ProfileOptionBuilder.float_operation()
+    options['output'] = 'none'
+    info = tf.compat.v1.profiler.profile(graph=frozen.graph, run_meta=tf.compat.v1.RunMetadata(),
+                                         cmd='op', options=options)
+    return info.total_float_ops + recurrent_flops(model, width)
+
+def latency_ms(model, width, batch_size, repeats):
+    spec = tf.TensorSpec((None, Config.IMG_HEIGHT, width, 1), tf.float32)
+    infer = tf.function(lambda image: model(image, training=False), input_signature=[spec])
+    batch = np.random.RandomState(0).rand(batch_size, Config.IMG_HEIGHT, width, 1).astype(np.float32)
+    
+    infer(batch)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        infer(batch).numpy()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000
+
+def validation_cer(model_path, max_samples=None):
+    from src.predict import BanglaOCRPredictor
+    from src.data_preprocessing import load_annotations
+    from src.utils import character_error_rate
+    
+    samples = load_annotations(Config.VAL_DIR)[:max_samples]
+    if not samples:
+        return None
+    predictor = BanglaOCRPredictor(model_path)
+    predictions = predictor.predict_batch([os.path.join(Config.VAL_DIR, sample['image']) for sample in samples])
+    return character_error_rate(predictions, [sample['text'] for sample in samples])
+
+def run(variants, weights, repeats=20, max_samples=None):
+    width = Config.IMG_WIDTH
+    print(f"Input: {Config.IMG_HEIGHT}x{width}, time steps: {Config.TIME_STEPS or width // 8}, "
+          f"median of {repeats} runs")
+    print(f" {'variant':<18} {'params':>10} {'MFLOPs':>10} {'b=1 ms':>9} "
+          f"{f'b={Config.PREDICT_BATCH_SIZE} ms':>9} {'val CER':>8}")
+    
+    for variant in variants:
+        model = build_crnn_model(variant)
+        flops = count_flops(model, width)
+        single = latency_ms(model, width, 1, repeats)
+        batched = latency_ms(model, width, Config.PREDICT_BATCH_SIZE, repeats)
+        cer = validation_cer(weights[variant], max_samples) if variant in weights else None
+        cer_text = f"{cer:8.4f}" if cer is not None else f"{'-':>8}"
+        print(f" {variant:<18} {model.count_params():>10,} {flops / 1e6:>10.1f} {single:>9.2f} "
+              f"{batched:>9.2f} {cer_text}")
+        tf.keras.backend.clear_session()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare CRNN backbone variants")
+    parser.add_argument('--variants', nargs='+', default=list(MODEL_VARIANTS), choices=list(MODEL_VARIANTS))
+    parser.add_argument('--weights', nargs='*', default=[], metavar='VARIANT=PATH',
+                        help="trained model per variant, used for validation CER")
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--max-samples', type=int, default=None, help="validation samples for CER")
+    args = parser.parse_args()
+    
+    weights = dict(item.split('=', 1) for item in args.weights)
+    run(args.variants, weights, args.repeats, args.max_samples)
@@ -0,0 +1,35 @@
+"""
+Compile each split into memory-mapped .npy shards for fast training
+Training recompiles a split automatically when annotations.json or the
+image settings in config.py change; run this to do it ahead of time
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+from config import Config
+from src.data_preprocessing import compile_dataset
+
+def compile_all():
+    print("="*70)
+    print("Compiling dataset")
+    print("="*70)
+    print()
+    
+    for split_dir in [Config.TRAIN_DIR, Config.VAL_DIR, Config.TEST_DIR]:
+        split = os.path.basename(split_dir)
+        meta = compile_dataset(split_dir)
+        if meta is None:
+            print(f" {split}: annotations.json not found, skipping")
+            continue
+        total = sum(meta['shards'].values())
+        widths = ', '.join(f"{w}px: {n}" for w, n in meta['shards'].items())
+        print(f" {split}: {total} samples ({widths})")
+    
+    print()
+    print("Set USE_COMPILED_DATASET = True in config.py to train from the compiled files")
+
+if __name__ == "__main__":
+    compile_all()
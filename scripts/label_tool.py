@@ -1,12 +1,29 @@
 """
 Simple web-based labeling tool for Bangla OCR
 View images and add text labels
+Labels are kept in data/<split>/annotations.db (src/annotation_store.py) and
+exported to annotations.json every Config.LABEL_EXPORT_SECONDS and on exit;
+run with --export to write annotations.json without starting the server
+Pages show cached previews and line crops (src/previews.py); the full
+scan opens when the image is clicked
+With --prelabel [MODEL] a CRNN fills in suggestions for unlabeled items in
+the background (src/prelabel.py) and they can be reviewed least confident first
 """
 
-from flask import Flask, render_template, request, jsonify
-import json
-import os
+import sys
 from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from flask import Flask, render_template, request, jsonify, abort, send_file
+import os
+import time
+import atexit
+import argparse
+import threading
+from config import Config
+from src.annotation_store import AnnotationStore, is_labeled
+from src.previews import PreviewCache
+from src.prelabel import PrelabelWorker
 
 app = Flask(__name__)
 
@@ -14,44 +31,128 @@ app = Flask(__name__)
 PROJECT_ROOT = Path(__file__).parent.parent
 DATA_SPLITS = ['train', 'val', 'test']
 
-def load_annotations(split):
-    """Load annotations for a split"""
-    ann_file = PROJECT_ROOT / 'data' / split / 'annotations.json'
-    if ann_file.exists():
-        with open(ann_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+stores = {}
+stores_lock = threading.Lock()
+previews = PreviewCache(os.path.join(Config.DATA_DIR, '.previews'))
+prelabeler = None
+
+def get_store(split):
+    """AnnotationStore for a split, opened on first use"""
+    if split not in DATA_SPLITS:
+        abort(404)
+    with stores_lock:
+        if split not in stores:
+            stores[split] = AnnotationStore(PROJECT_ROOT / 'data' / split)
+        return stores[split]
+
+def image_path(split, filename):
+    if split not in DATA_SPLITS:
+        abort(404)
+    return str(PROJECT_ROOT / 'data' / split / filename)
+
+def preview_url(split, filename):
+    """Versioned preview URL, or the original when no preview can be made"""
+    try:
+        return f'/preview/{split}/{filename}?v={previews.key(image_path(split, filename))}'
+    except OSError:
+        return f'/images/{split}/{filename}'
+
+def line_urls(split, filename):
+    source = image_path(split, filename)
+    try:
+        key = previews.build(source)
+        count = len(previews.boxes(source))
+    except (OSError, ValueError) as e:
+        print(f"Preview failed for {source}: {e}")
+        return []
+    return [f'/lines/{split}/{filename}/{n}?v={key}' for n in range(count)]
+
+def send_derivative(path, etag, mimetype):
+    """Send a cached preview; URLs carrying its version are cached for good"""
+    versioned = request.args.get('v') == etag.split('-')[0]
+    response = send_file(path, mimetype=mimetype, etag=etag, conditional=True,
+                         max_age=31536000 if versioned else 0)
+    if versioned:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
 
-def save_annotations(split, annotations):
-    """Save annotations for a split"""
-    ann_file = PROJECT_ROOT / 'data' / split / 'annotations.json'
-    with open(ann_file, 'w', encoding='utf-8') as f:
-        json.dump(annotations, f, ensure_ascii=False, indent=2)
+def export_all():
+    """Write pending edits of every open store to annotations.json"""
+    for split, store in list(stores.items()):
+        exported = store.sync()
+        if exported:
+            print(f"Exported {split}/annotations.json ({exported} entries)")
+
+def export_loop():
+    while True:
+        time.sleep(Config.LABEL_EXPORT_SECONDS)
+        try:
+            export_all()
+        except OSError as e:
+            print(f"Export failed: {e}")
 
 @app.route('/')
 def index():
     return render_template('labeling.html')
 
-@app.route('/api/get_image/<split>/<int:index>')
-def get_image(split, index):
-    """Get image info for labeling"""
-    annotations = load_annotations(split)
-    
-    if index >= len(annotations):
+def item_response(split, store, index, upcoming):
+    """Labeling payload for item `index`; `upcoming` are the indices shown after it"""
+    item = store.get(index)
+    if item is None:
         return jsonify({'done': True})
     
-    item = annotations[index]
-    img_path = f'/images/{split}/{item["image"]}'
+    if prelabeler is not None:
+        prelabeler.hint(split, index)
+    
+    # The next few items are rendered in the background and returned so
+    # the page can prefetch their previews before the labeler gets there
+    next_items = []
+    for next_index in upcoming:
+        next_item = store.get(next_index)
+        if next_item is None:
+            break
+        next_items.append({'index': next_index, 'image': preview_url(split, next_item['image'])})
+        previews.prefetch([image_path(split, next_item['image'])])
+    
+    # Unlabeled items start from the model's suggestion when there is one
+    text = item['text']
+    if not is_labeled(text) and item.get('prediction'):
+        text = item['prediction']
     
     return jsonify({
         'done': False,
         'index': index,
-        'total': len(annotations),
-        'image': img_path,
-        'current_text': item['text'],
+        'total': store.counts()['total'],
+        'image': preview_url(split, item['image']),
+        'original': f'/images/{split}/{item["image"]}',
+        'lines': line_urls(split, item['image']),
+        'next': next_items,
+        'current_text': text,
+        'prediction': item.get('prediction'),
+        'confidence': item.get('confidence'),
         'filename': item['image']
     })
 
+@app.route('/api/get_image/<split>/<int:index>')
+def get_image(split, index):
+    """Get image info for labeling"""
+    return item_response(split, get_store(split), index, range(index + 1, index + 1 + Config.LABEL_PREFETCH))
+
+@app.route('/api/queue/<split>')
+def review_queue(split):
+    """Next (?after=index) or previous (?before=index) unlabeled item, least confident prediction first"""
+    store = get_store(split)
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    
+    indices = store.review_queue(after=after, before=before)
+    if not indices:
+        return jsonify({'done': True})
+    index = indices[0]
+    return item_response(split, store, index, store.review_queue(after=index, limit=Config.LABEL_PREFETCH))
+
 @app.route('/api/save_label', methods=['POST'])
 def save_label():
     """Save a label"""
@@ -60,34 +161,73 @@ def save_label():
     index = data['index']
     text = data['text']
     
-    annotations = load_annotations(split)
-    annotations[index]['text'] = text
-    save_annotations(split, annotations)
+    try:
+        get_store(split).update(index, text)
+    except IndexError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
     
     return jsonify({'success': True})
 
 @app.route('/api/stats')
 def stats():
     """Get labeling statistics"""
-    stats = {}
-    for split in DATA_SPLITS:
-        annotations = load_annotations(split)
-        labeled = sum(1 for a in annotations if a['text'] and a['text'] != 'LABEL_NEEDED')
-        stats[split] = {
-            'total': len(annotations),
-            'labeled': labeled,
-            'unlabeled': len(annotations) - labeled
-        }
+    stats = {split: get_store(split).counts() for split in DATA_SPLITS}
     return jsonify(stats)
 
+@app.route('/api/prelabel')
+def prelabel_status():
+    """Pre-labeling worker progress"""
+    if prelabeler is None:
+        return jsonify({'status': 'disabled'})
+    return jsonify(prelabeler.stats())
+
+@app.route('/api/export', methods=['POST'])
+def export():
+    """Write annotations.json for every split now"""
+    export_all()
+    return jsonify({'success': True})
+
 @app.route('/images/<split>/<filename>')
 def serve_image(split, filename):
-    """Serve image files"""
-    from flask import send_file
-    img_path = PROJECT_ROOT / 'data' / split / filename
-    return send_file(img_path)
+    """Serve the full-resolution original"""
+    return send_file(image_path(split, filename), conditional=True, max_age=3600)
+
+@app.route('/preview/<split>/<filename>')
+def serve_preview(split, filename):
+    """Serve a downscaled preview from the derivative cache"""
+    try:
+        path, etag = previews.preview(image_path(split, filename))
+    except (OSError, ValueError):
+        abort(404)
+    return send_derivative(path, etag, previews.mimetype)
+
+@app.route('/lines/<split>/<filename>/<int:n>')
+def serve_line(split, filename, n):
+    """Serve line crop `n` of a paragraph image"""
+    try:
+        path, etag = previews.line(image_path(split, filename), n)
+    except (OSError, ValueError):
+        abort(404)
+    if path is None:
+        abort(404)
+    return send_derivative(path, etag, previews.mimetype)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bangla OCR labeling tool")
+    parser.add_argument('--export', action='store_true', help="write annotations.json for every split and exit")
+    parser.add_argument('--prelabel', nargs='?', const='latest', default=None, metavar='MODEL',
+                        help="suggest labels with a trained model (default: newest in MODEL_DIR)")
+    args = parser.parse_args()
+    
+    if args.export:
+        for split in DATA_SPLITS:
+            store = get_store(split)
+            if not store.counts()['total']:
+                continue
+            count = store.export()
+            print(f"Exported {split}/annotations.json ({count} entries)")
+        sys.exit(0)
+    
     # Create templates directory
     templates_dir = Path(__file__).parent / 'templates'
     templates_dir.mkdir(exist_ok=True)
@@ -138,7 +278,7 @@ if __name__ == '__main__':
             display: flex;
             gap: 10px;
         }
-        .split-btn {
+        .split-btn, .order-btn {
             padding: 10px 20px;
             border: 2px solid #667eea;
             background: white;
@@ -148,7 +288,7 @@ if __name__ == '__main__':
             font-size: 1rem;
             transition: all 0.3s;
         }
-        .split-btn.active {
+        .split-btn.active, .order-btn.active {
             background: #667eea;
             color: white;
         }
@@ -173,6 +313,17 @@ if __name__ == '__main__':
             max-height: 400px;
             border-radius: 8px;
         }
+        .lines {
+            display: flex;
+            flex-direction: column;
+            gap: 8px;
+            margin-bottom: 20px;
+        }
+        .lines img {
+            max-width: 100%;
+            border: 1px solid #ddd;
+            border-radius: 4px;
+        }
         .label-input-area {
             display: flex;
             flex-direction: column;
@@ -264,19 +415,25 @@ if __name__ == '__main__':
             <button class="split-btn" data-split="test">Test</button>
         </div>
         
+        <div class="split-selector">
+            <button class="order-btn active" data-order="file">File order</button>
+            <button class="order-btn" data-order="confidence">Least confident first</button>
+        </div>
+        
         <div class="progress">
             <div class="progress-bar" id="progress">0 / 0</div>
         </div>
         
         <div class="labeling-area">
             <div class="image-preview">
-                <img id="image" src="" alt="Loading...">
+                <a id="original" href="" target="_blank"><img id="image" src="" alt="Loading..."></a>
             </div>
             
             <div class="label-input-area">
                 <div class="info">
                     <strong>File:</strong> <span id="filename">-</span><br>
-                    <strong>Index:</strong> <span id="current-index">0</span> / <span id="total-count">0</span>
+                    <strong>Index:</strong> <span id="current-index">0</span> / <span id="total-count">0</span><br>
+                    <strong>Model confidence:</strong> <span id="confidence">-</span>
                 </div>
                 
                 <label><strong>Bangla Text:</strong></label>
@@ -291,6 +448,8 @@ if __name__ == '__main__':
             </div>
         </div>
         
+        <div class="lines" id="lines"></div>
+        
         <div class="shortcuts">
             <h3> Keyboard Shortcuts</h3>
             <ul>
@@ -304,36 +463,70 @@ if __name__ == '__main__':
     <script>
         let currentSplit = 'train';
         let currentIndex = 0;
+        let order = 'file';
+        
+        function prefetch(items) {
+            // Warm the browser cache with the next previews
+            items.forEach(item => { new Image().src = item.image; });
+        }
         
         async function loadStats() {
             const res = await fetch('/api/stats');
             const stats = await res.json();
             
-            const statsHtml = Object.entries(stats).map(([split, data]) => `
-                <div class="stat-card">
-                    <h3>${split.toUpperCase()}</h3>
-                    <div class="number">${data.labeled} / ${data.total}</div>
-                    <small>${data.unlabeled} unlabeled</small>
-                </div>
-            `).join('');
+            // Built as nodes so split names are never parsed as HTML
+            const cards = Object.entries(stats).map(([split, data]) => {
+                const card = document.createElement('div');
+                card.className = 'stat-card';
+                const title = document.createElement('h3');
+                title.textContent = split.toUpperCase();
+                const number = document.createElement('div');
+                number.className = 'number';
+                number.textContent = `${data.labeled} / ${data.total}`;
+                const unlabeled = document.createElement('small');
+                unlabeled.textContent = `${data.unlabeled} unlabeled`;
+                card.append(title, number, unlabeled);
+                return card;
+            });
             
-            document.getElementById('stats').innerHTML = statsHtml;
+            document.getElementById('stats').replaceChildren(...cards);
         }
         
         async function loadImage(index) {
             const res = await fetch(`/api/get_image/${currentSplit}/${index}`);
-            const data = await res.json();
-            
+            await showItem(await res.json());
+        }
+        
+        async function loadQueue(params) {
+            // Unlabeled items with a model suggestion, least confident first
+            const res = await fetch(`/api/queue/${currentSplit}?${params}`);
+            await showItem(await res.json());
+        }
+        
+        async function showItem(data) {
             if (data.done) {
-                alert(`All ${currentSplit} images labeled! `);
+                alert(order === 'confidence'
+                    ? `No more ${currentSplit} suggestions to review`
+                    : `All ${currentSplit} images labeled! `);
                 await loadStats();
                 return;
             }
             
             currentIndex = data.index;
             document.getElementById('image').src = data.image;
+            document.getElementById('original').href = data.original;
+            // Line URLs carry the file name, so they are set as attributes, not markup
+            document.getElementById('lines').replaceChildren(...(data.lines.length > 1 ? data.lines : []).map(src => {
+                const line = document.createElement('img');
+                line.src = src;
+                line.alt = 'line';
+                return line;
+            }));
+            prefetch(data.next);
             document.getElementById('filename').textContent = data.filename;
             document.getElementById('text-input').value = data.current_text;
+            document.getElementById('confidence').textContent =
+                data.confidence === null ? '-' : `${(data.confidence * 100).toFixed(1)}%`;
             document.getElementById('current-index').textContent = data.index + 1;
             document.getElementById('total-count').textContent = data.total;
             
@@ -360,19 +553,37 @@ if __name__ == '__main__':
             await loadStats();
         }
         
+        async function next() {
+            if (order === 'confidence') {
+                await loadQueue(`after=${currentIndex}`);
+            } else {
+                await loadImage(currentIndex + 1);
+            }
+        }
+        
         async function saveAndNext() {
             await saveLabel();
-            await loadImage(currentIndex + 1);
+            await next();
         }
         
         async function previous() {
-            if (currentIndex > 0) {
+            if (order === 'confidence') {
+                await loadQueue(`before=${currentIndex}`);
+            } else if (currentIndex > 0) {
                 await loadImage(currentIndex - 1);
             }
         }
         
         async function skip() {
-            await loadImage(currentIndex + 1);
+            await next();
+        }
+        
+        function restart() {
+            if (order === 'confidence') {
+                loadQueue('');
+            } else {
+                loadImage(0);
+            }
         }
         
         // Split selector
@@ -381,7 +592,17 @@ if __name__ == '__main__':
                 document.querySelectorAll('.split-btn').forEach(b => b.classList.remove('active'));
                 btn.classList.add('active');
                 currentSplit = btn.dataset.split;
-                loadImage(0);
+                restart();
+            });
+        });
+        
+        // Order selector
+        document.querySelectorAll('.order-btn').forEach(btn => {
+            btn.addEventListener('click', () => {
+                document.querySelectorAll('.order-btn').forEach(b => b.classList.remove('active'));
+                btn.classList.add('active');
+                order = btn.dataset.order;
+                restart();
             });
         });
         
@@ -431,4 +652,23 @@ if __name__ == '__main__':
     print("  Ctrl+→ - Skip")
     print()
     
-    app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
+    if args.prelabel:
+        model_path = args.prelabel
+        if model_path == 'latest':
+            from src.registry import ModelRegistry
+            registry = ModelRegistry()
+            version = registry.latest()
+            model_path = registry.available()[version] if version else None
+        if model_path and os.path.exists(model_path):
+            # Open every split so all of them get predictions
+            for split in DATA_SPLITS:
+                get_store(split)
+            prelabeler = PrelabelWorker(model_path, lambda: dict(stores)).start()
+            print(f"Pre-labeling with: {model_path}")
+        else:
+            print(f"Warning: No model for pre-labeling ({args.prelabel}); train one first")
+    
+    threading.Thread(target=export_loop, name='annotation-export', daemon=True).start()
+    atexit.register(export_all)
+    # The reloader would start a second pre-labeling worker in its parent process
+    app.run(debug=True, host='0.0.0.0', port=5001, use_reloader=prelabeler is None)
\ No newline at end of file
@@ -0,0 +1,235 @@
+"""
+Indexed annotation store for the labeling tool
+A SQLite file next to annotations.json gives O(1) reads and single-row
+label updates; annotations.json stays the format training reads and is
+rewritten by export() only, not on every edit. Model pre-labels are kept
+in separate columns and never exported as labels.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+
+UNLABELED = ('', 'LABEL_NEEDED')
+UNLABELED_SQL = f"text IN ({', '.join('?' * len(UNLABELED))})"
+
+def is_labeled(text):
+    return bool(text) and text not in UNLABELED
+
+class AnnotationStore:
+    """Annotations of one split in `split_dir`/annotations.db
+    
+    The database is imported from annotations.json on first use and again
+    whenever that file changes on disk (e.g. after auto_label_easyocr.py);
+    rows edited here but not exported yet keep their text across such an
+    import. Every update runs in its own write transaction, so several
+    label tool processes can share one store without losing edits.
+    """
+    
+    def __init__(self, split_dir, db_name='annotations.db'):
+        self.split_dir = str(split_dir)
+        self.json_path = os.path.join(split_dir, 'annotations.json')
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(split_dir, db_name), timeout=30,
+                                  isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS items (idx INTEGER PRIMARY KEY, image TEXT NOT NULL, "
+                        "text TEXT NOT NULL, extra TEXT NOT NULL, dirty INTEGER NOT NULL DEFAULT 0)")
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(items)")}
+        if 'confidence' not in columns:
+            self.db.execute("ALTER TABLE items ADD COLUMN prediction TEXT")
+            self.db.execute("ALTER TABLE items ADD COLUMN confidence REAL")
+        self.db.execute("CREATE INDEX IF NOT EXISTS dirty_items ON items (idx) WHERE dirty = 1")
+        self.db.execute("CREATE INDEX IF NOT EXISTS review_queue ON items (confidence, idx) WHERE confidence IS NOT NULL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        self.refresh()
+    
+    def _json_stat(self):
+        try:
+            stat = os.stat(self.json_path)
+        except FileNotFoundError:
+            return None
+        return f'{stat.st_mtime_ns}:{stat.st_size}'
+    
+    def _meta(self, key, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+    
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+    
+    def refresh(self):
+        """Re-import annotations.json if it changed since the last import or export"""
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                stat = self._json_stat()
+                if stat is not None and stat != self._meta('json_stat'):
+                    self._import(stat)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+    
+    def _import(self, stat):
+        with open(self.json_path, 'r', encoding='utf-8') as f:
+            annotations = json.load(f)
+        
+        edited = dict(self.db.execute("SELECT image, text FROM items WHERE dirty = 1"))
+        predicted = {image: (prediction, confidence) for image, prediction, confidence in self.db.execute(
+            "SELECT image, prediction, confidence FROM items WHERE confidence IS NOT NULL")}
+        self.db.execute("DELETE FROM items")
+        rows = []
+        for idx, item in enumerate(annotations):
+            extra = {key: value for key, value in item.items() if key not in ('image', 'text')}
+            image = item['image']
+            text = edited.get(image, item.get('text', ''))
+            prediction, confidence = predicted.get(image, (None, None))
+            rows.append((idx, image, text, json.dumps(extra, ensure_ascii=False), int(image in edited),
+                         prediction, confidence))
+        self.db.executemany("INSERT INTO items (idx, image, text, extra, dirty, prediction, confidence) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        
+        self._set_meta('total', len(rows))
+        self._set_meta('labeled', sum(1 for row in rows if is_labeled(row[2])))
+        self._set_meta('json_stat', stat)
+        if edited:
+            print(f"{self.json_path} changed on disk; kept {len(edited)} unexported edits")
+    
+    def get(self, index):
+        """{'image', 'text', ...} at `index`, or None past the end
+        
+        Items the pre-labeling model has seen also carry 'prediction' and
+        'confidence'.
+        """
+        with self.lock:
+            row = self.db.execute("SELECT image, text, extra, prediction, confidence FROM items WHERE idx = ?",
+                                  (index,)).fetchone()
+        if row is None:
+            return None
+        image, text, extra, prediction, confidence = row
+        item = {'image': image, 'text': text, **json.loads(extra)}
+        if confidence is not None:
+            item.update(prediction=prediction, confidence=confidence)
+        return item
+    
+    def update(self, index, text):
+        """Set the label at `index`; the labeled counter is adjusted in the same transaction"""
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT text FROM items WHERE idx = ?", (index,)).fetchone()
+                if row is None:
+                    raise IndexError(f"No annotation at index {index}")
+                self.db.execute("UPDATE items SET text = ?, dirty = 1 WHERE idx = ?", (text, index))
+                delta = int(is_labeled(text)) - int(is_labeled(row[0]))
+                if delta:
+                    self.db.execute("UPDATE meta SET value = value + ? WHERE key = 'labeled'", (delta,))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+    
+    def counts(self):
+        with self.lock:
+            total = self._meta('total', 0)
+            labeled = self._meta('labeled', 0)
+        return {'total': total, 'labeled': labeled, 'unlabeled': total - labeled}
+    
+    def unpredicted(self, limit, start=0):
+        """(idx, image) of unlabeled items without a prediction, from `start` on, wrapping around"""
+        query = f"SELECT idx, image FROM items WHERE confidence IS NULL AND {UNLABELED_SQL}"
+        with self.lock:
+            rows = self.db.execute(query + " AND idx >= ? ORDER BY idx LIMIT ?", (*UNLABELED, start, limit)).fetchall()
+            if len(rows) < limit and start > 0:
+                rows += self.db.execute(query + " AND idx < ? ORDER BY idx LIMIT ?",
+                                        (*UNLABELED, start, limit - len(rows))).fetchall()
+        return rows
+    
+    def set_predictions(self, predictions):
+        """Store (idx, image, text, confidence) rows; rows whose image moved are skipped"""
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.executemany("UPDATE items SET prediction = ?, confidence = ? WHERE idx = ? AND image = ?",
+                                    [(text, confidence, idx, image) for idx, image, text, confidence in predictions])
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+    
+    def reset_predictions(self, model):
+        """Drop predictions made by a model other than `model`"""
+        with self.lock:
+            if self._meta('prediction_model') == model:
+                return
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute("UPDATE items SET prediction = NULL, confidence = NULL WHERE confidence IS NOT NULL")
+                self._set_meta('prediction_model', model)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+    
+    def review_queue(self, after=None, before=None, limit=1):
+        """Indices of unlabeled, predicted items in order of increasing confidence
+        
+        Pages by key rather than offset, so labeling an item (which drops it
+        from the queue) does not shift the position of the ones after it:
+        pass the current index as `after` for the next items or as `before`
+        for the previous ones.
+        """
+        anchor = after if after is not None else before
+        with self.lock:
+            key = None
+            if anchor is not None:
+                key = self.db.execute("SELECT confidence, idx FROM items WHERE idx = ? AND confidence IS NOT NULL",
+                                      (anchor,)).fetchone()
+            query = f"SELECT idx FROM items WHERE confidence IS NOT NULL AND {UNLABELED_SQL}"
+            params = list(UNLABELED)
+            if key is not None:
+                query += " AND (confidence, idx) > (?, ?)" if after is not None else " AND (confidence, idx) < (?, ?)"
+                params += key
+            order = "DESC" if key is not None and after is None else "ASC"
+            query += f" ORDER BY confidence {order}, idx {order} LIMIT ?"
+            rows = self.db.execute(query, (*params, limit)).fetchall()
+        return [row[0] for row in rows]
+    
+    def dirty(self):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM items WHERE dirty = 1 LIMIT 1").fetchone() is not None
+    
+    def export(self, path=None):
+        """Write the store as annotations.json (atomically); returns the number of entries"""
+        path = path or self.json_path
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                annotations = [{'image': image, 'text': text, **json.loads(extra)} for image, text, extra
+                               in self.db.execute("SELECT image, text, extra FROM items ORDER BY idx")]
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(annotations, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, path)
+                
+                if path == self.json_path:
+                    self.db.execute("UPDATE items SET dirty = 0 WHERE dirty = 1")
+                    self._set_meta('json_stat', self._json_stat())
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return len(annotations)
+    
+    def sync(self):
+        """Pick up external changes to annotations.json, then export pending edits"""
+        self.refresh()
+        if self.dirty():
+            return self.export()
+        return 0
+    
+    def close(self):
+        with self.lock:
+            self.db.close()
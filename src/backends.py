@@ -0,0 +1,150 @@
+"""
+Inference backends for BanglaOCRPredictor
+Each backend maps a float32 (N, H, W, 1) batch to (N, T, NUM_CLASSES) probabilities
+Runtimes are imported on first use and the import time is kept in `import_time`
+"""
+
+import os
+import time
+import threading
+import numpy as np
+from config import Config
+
+class KerasBackend:
+    """Full TensorFlow runtime serving a Keras .h5 model
+    
+    The forward pass is called through one tf.function per input width with
+    a fixed input signature, which skips the data adapter and callback setup
+    Keras predict() pays on every call. predict_decoded() also runs the
+    greedy CTC collapse inside the same graph.
+    """
+    
+    name = 'keras'
+    
+    def __init__(self, model_path):
+        start = time.perf_counter()
+        import tensorflow as tf
+        self.import_time = time.perf_counter() - start
+        if Config.INFERENCE_THREADS:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(Config.INFERENCE_THREADS)
+            except RuntimeError:
+                # Thread pools are fixed once TensorFlow has initialised
+                print("INFERENCE_THREADS ignored: TensorFlow is already initialised")
+        self.tf = tf
+        self.model = tf.keras.models.load_model(model_path, compile=False)
+        self.functions = {}
+    
+    def _function(self, width):
+        """Compiled (probabilities, collapsed labels) function for one input width"""
+        if width not in self.functions:
+            tf = self.tf
+            spec = tf.TensorSpec((None, Config.IMG_HEIGHT, width, 1), tf.float32, name='image')
+            blank = Config.NUM_CLASSES - 1
+            
+            @tf.function(input_signature=[spec])
+            def infer(batch):
+                probs = self.model(batch, training=False)
+                best = tf.argmax(probs, axis=-1, output_type=tf.int32)
+                
+                # Greedy CTC: drop repeats and blanks, -1 marks removed steps
+                changed = tf.concat([tf.ones_like(best[:, :1], dtype=tf.bool), best[:, 1:] != best[:, :-1]], axis=1)
+                labels = tf.where(changed & (best != blank), best, -1)
+                return probs, labels
+            
+            self.functions[width] = infer
+        return self.functions[width]
+    
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self._function(batch.shape[2])(batch)[0].numpy()
+    
+    def predict_decoded(self, batch):
+        """(N, T) greedy CTC label rows, already collapsed, padded with -1"""
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self._function(batch.shape[2])(batch)[1].numpy()
+
+class TFLiteBackend:
+    """TFLite interpreter (tflite_runtime if installed, else tf.lite)
+    
+    One interpreter holds one set of input/output tensors, so calls from
+    several threads (threaded web servers, the pre-labeling worker) are
+    serialized by a lock.
+    """
+    
+    name = 'tflite'
+    
+    def __init__(self, model_path):
+        start = time.perf_counter()
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self.import_time = time.perf_counter() - start
+        
+        self.interpreter = Interpreter(model_path=model_path, num_threads=Config.INFERENCE_THREADS)
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.input_shape = None
+        self.lock = threading.Lock()
+    
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        
+        with self.lock:
+            # Batch size and width may change between calls
+            if self.input_shape != batch.shape:
+                self.interpreter.resize_tensor_input(self.input_index, batch.shape)
+                self.interpreter.allocate_tensors()
+                self.input_shape = batch.shape
+            
+            self.interpreter.set_tensor(self.input_index, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
+
+class ONNXBackend:
+    """onnxruntime session for models exported with src/export.py"""
+    
+    name = 'onnx'
+    
+    def __init__(self, model_path):
+        start = time.perf_counter()
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("ONNX backend requires: pip install onnxruntime")
+        self.import_time = time.perf_counter() - start
+        
+        options = ort.SessionOptions()
+        if Config.INFERENCE_THREADS:
+            options.intra_op_num_threads = Config.INFERENCE_THREADS
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+    
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self.session.run(None, {self.input_name: batch})[0]
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'onnx': ONNXBackend,
+}
+
+EXTENSIONS = {
+    '.h5': 'keras',
+    '.keras': 'keras',
+    '.tflite': 'tflite',
+    '.onnx': 'onnx',
+}
+
+def load_backend(model_path, backend=None):
+    """Load a model with the given backend, or pick one from the file extension"""
+    if backend is None:
+        backend = EXTENSIONS.get(os.path.splitext(model_path)[1].lower(), 'keras')
+    
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {sorted(BACKENDS)}")
+    
+    return BACKENDS[backend](model_path)
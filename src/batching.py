@@ -0,0 +1,107 @@
+"""
+Request micro-batching for the web app
+Requests arriving within a short window are run as one forward pass
+"""
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from config import Config
+
+class QueueFullError(Exception):
+    """Raised by submit() when the request queue is at its maximum depth"""
+
+class _Request:
+    __slots__ = ('item', 'future', 'enqueued')
+    
+    def __init__(self, item):
+        self.item = item
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+class MicroBatcher:
+    """Background thread that groups requests into batches
+    
+    `predict_fn` takes a list of inputs and returns one result per input.
+    Each submitted request gets a Future resolving to a dict with its
+    result and its own 'queue_wait' and 'inference' times (seconds).
+    """
+    
+    def __init__(self, predict_fn, max_batch_size=None, window_ms=None, queue_depth=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size or Config.SERVE_MAX_BATCH_SIZE
+        self.window = (window_ms if window_ms is not None else Config.SERVE_BATCH_WINDOW_MS) / 1000
+        self.queue = queue.Queue(maxsize=queue_depth or Config.SERVE_QUEUE_DEPTH)
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'batches': 0, 'rejected': 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+    
+    def submit(self, item):
+        """Queue one input and return a Future for its result"""
+        request = _Request(item)
+        try:
+            self.queue.put_nowait(request)
+        except queue.Full:
+            with self.lock:
+                self.counters['rejected'] += 1
+            raise QueueFullError(f"Request queue is full ({self.queue.maxsize})")
+        return request.future
+    
+    def predict(self, item, timeout=None):
+        """Blocking submit(): the result dict for one input"""
+        return self.submit(item).result(timeout=timeout)
+    
+    def _collect(self):
+        """Wait for a first request, then gather more until the window closes"""
+        try:
+            batch = [self.queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            
+            start = time.perf_counter()
+            try:
+                results = self.predict_fn([request.item for request in batch])
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            inference = time.perf_counter() - start
+            
+            with self.lock:
+                self.counters['requests'] += len(batch)
+                self.counters['batches'] += 1
+            for request, result in zip(batch, results):
+                request.future.set_result({
+                    'result': result,
+                    'queue_wait': start - request.enqueued,
+                    'inference': inference,
+                    'batch_size': len(batch),
+                })
+    
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+    
+    def close(self):
+        self._stop.set()
+        self._thread.join()
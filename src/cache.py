@@ -0,0 +1,110 @@
+"""
+Prediction result cache keyed by decoded image content and model version
+An in-memory LRU tier, optionally backed by a SQLite file that survives restarts
+"""
+
+import os
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import Config
+
+# Every Config value that can change the text predicted for an image
+OUTPUT_SETTINGS = (
+    'CHARACTERS', 'IMG_HEIGHT', 'IMG_WIDTH', 'MAX_TEXT_LENGTH', 'MODEL_VARIANT', 'TIME_STEPS', 'MIXED_PRECISION',
+    'RESIZE_MODE', 'WIDTH_BUCKETS',
+    'DECODER', 'BEAM_WIDTH', 'BEAM_PRUNE_THRESHOLD', 'LM_ORDER', 'LM_WEIGHT',
+    'SEGMENT_LINES', 'LINE_PROFILE_THRESHOLD', 'LINE_MIN_HEIGHT', 'LINE_MIN_GAP', 'LINE_MARGIN',
+)
+
+def model_version(model_path):
+    """Content hash of the model file plus the settings that change its output"""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    
+    settings = [(name, getattr(Config, name)) for name in OUTPUT_SETTINGS]
+    if Config.DECODER == 'beam' and Config.LM_ORDER > 0:
+        # The LM is fit on the train annotations at startup
+        lm_source = os.path.join(Config.TRAIN_DIR, 'annotations.json')
+        if os.path.exists(lm_source):
+            stat = os.stat(lm_source)
+            settings.append(('lm_source', stat.st_size, stat.st_mtime_ns))
+    digest.update(repr(settings).encode())
+    return digest.hexdigest()[:16]
+
+class ResultCache:
+    """Thread-safe text cache for BanglaOCRPredictor
+    
+    Keys hash the decoded image (pixels and shape), the kind of prediction
+    ('line' or 'paragraph') and the model version, so re-encoded copies of
+    the same scan hit and a new model never serves stale results.
+    """
+    
+    def __init__(self, version, max_entries=None, disk_path=None):
+        self.version = version
+        self.max_entries = max_entries or Config.RESULT_CACHE_SIZE
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        
+        disk_path = disk_path or Config.RESULT_CACHE_DB
+        self.db = None
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self.db = sqlite3.connect(disk_path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, text TEXT NOT NULL)")
+            self.db.commit()
+    
+    def key(self, img, kind='line'):
+        img = np.ascontiguousarray(img)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{self.version}:{kind}:{img.dtype}:{img.shape}'.encode())
+        digest.update(img.data)
+        return digest.hexdigest()
+    
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return self.entries[key]
+            
+            if self.db is not None:
+                row = self.db.execute("SELECT text FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.counters['disk_hits'] += 1
+                    self._remember(key, row[0])
+                    return row[0]
+            
+            self.counters['misses'] += 1
+            return None
+    
+    def put(self, key, text):
+        with self.lock:
+            self._remember(key, text)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO results (key, text) VALUES (?, ?)", (key, text))
+                self.db.commit()
+    
+    def _remember(self, key, text):
+        self.entries[key] = text
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters['evictions'] += 1
+    
+    def stats(self):
+        with self.lock:
+            return {**self.counters, 'size': len(self.entries), 'max_entries': self.max_entries,
+                    'disk': self.db is not None, 'version': self.version}
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM results")
+                self.db.commit()
@@ -3,80 +3,452 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import os
+import random
+import shutil
+import multiprocessing
 import numpy as np
 import tensorflow as tf
 import json
 import albumentations as A
+from PIL import Image
 from config import Config
-from src.utils import encode_text, preprocess_image
+from src.utils import encode_batch, load_image, preprocess_image, resize_image, bucket_width
+from src.profiling import StageTimer
+
+EXIF_ORIENTATION = 0x0112
+
+def load_annotations(data_dir):
+    """Load annotations.json created by build_annotations.py"""
+    annotation_file = os.path.join(data_dir, 'annotations.json')
+    
+    if not os.path.exists(annotation_file):
+        print(f" Error: {annotation_file} not found!")
+        return []
+    
+    with open(annotation_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    return data
+
+def build_augmentor():
+    return A.Compose([
+        A.RandomBrightnessContrast(brightness_limit=0.2, contrast_limit=0.2, p=0.5),
+        A.GaussNoise(var_limit=(10, 50), p=0.3),
+        A.Rotate(limit=5, p=0.3),
+        A.ElasticTransform(alpha=1, sigma=50, p=0.2),
+    ])
+
+def sample_bucket(data_dir, sample):
+    """Width bucket of a sample (IMG_WIDTH unless RESIZE_MODE is 'bucket')"""
+    if Config.RESIZE_MODE != 'bucket':
+        return Config.IMG_WIDTH
+    
+    # PIL only reads the header here, not the pixels. cv2.imread applies the
+    # EXIF orientation, so sizes of rotated images are swapped to match; the
+    # batch is still resized to this bucket whatever the decoded size is
+    try:
+        with Image.open(os.path.join(data_dir, sample['image'])) as img:
+            width, height = img.size
+            if img.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+                width, height = height, width
+    except OSError:
+        return Config.IMG_WIDTH
+    return bucket_width(width, height)
+
+def compiled_signature(data_dir):
+    """Settings a compiled dataset depends on; any change makes it stale
+    
+    None when the split has no annotations.json.
+    """
+    annotation_file = os.path.join(data_dir, 'annotations.json')
+    try:
+        stat = os.stat(annotation_file)
+    except FileNotFoundError:
+        return None
+    return {
+        'annotations_mtime_ns': stat.st_mtime_ns,
+        'annotations_size': stat.st_size,
+        'resize_mode': Config.RESIZE_MODE,
+        'img_height': Config.IMG_HEIGHT,
+        'img_width': Config.IMG_WIDTH,
+        'width_buckets': list(Config.WIDTH_BUCKETS),
+        'max_text_length': Config.MAX_TEXT_LENGTH,
+    }
+
+def compile_dataset(data_dir, seed=42):
+    """Write preprocessed uint8 images and encoded labels as .npy shards
+    
+    One shard per width bucket: images_<w>.npy (N, IMG_HEIGHT, w) and
+    labels_<w>.npy (N, MAX_TEXT_LENGTH). Samples are shuffled once here so
+    contiguous slices make good batches. Returns None without annotations.
+    
+    The shards are written to a private directory that then replaces the
+    compiled directory, so files another training process has memory-mapped
+    are never rewritten in place; concurrent compiles just replace each other.
+    """
+    signature = compiled_signature(data_dir)
+    if signature is None:
+        print(f" Error: {os.path.join(data_dir, 'annotations.json')} not found!")
+        return None
+    
+    compiled_dir = os.path.join(data_dir, Config.COMPILED_DIR_NAME)
+    out_dir = f'{compiled_dir}.tmp{os.getpid()}'
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    try:
+        meta = _write_shards(data_dir, out_dir, signature, seed)
+    except BaseException:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        raise
+    
+    # A non-empty directory cannot be replaced, so the current one is moved
+    # aside (again if another compile slips in between); open memory maps
+    # keep its files alive after it is deleted
+    replaced = []
+    while True:
+        try:
+            os.replace(out_dir, compiled_dir)
+            break
+        except OSError:
+            if not os.path.exists(compiled_dir):
+                raise
+            replaced.append(f'{compiled_dir}.old{os.getpid()}.{len(replaced)}')
+            try:
+                os.replace(compiled_dir, replaced[-1])
+            except FileNotFoundError:
+                replaced.pop()
+    for old_dir in replaced:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    return meta
+
+def _write_shards(data_dir, out_dir, signature, seed):
+    samples = load_annotations(data_dir)
+    groups = {}
+    for i in np.random.RandomState(seed).permutation(len(samples)):
+        groups.setdefault(sample_bucket(data_dir, samples[i]), []).append(i)
+    
+    shards = {}
+    for width, indexes in sorted(groups.items()):
+        images = np.lib.format.open_memmap(
+            os.path.join(out_dir, f'images_{width}.npy'), mode='w+',
+            dtype=np.uint8, shape=(len(indexes), Config.IMG_HEIGHT, width)
+        )
+        texts = []
+        
+        for i in indexes:
+            img = load_image(os.path.join(data_dir, samples[i]['image']))
+            if img is None:
+                continue
+            img = resize_image(img, width)
+            
+            images[len(texts)] = img
+            texts.append(samples[i]['text'])
+        
+        count = len(texts)
+        images.flush()
+        del images
+        labels, _ = encode_batch(texts)
+        np.save(os.path.join(out_dir, f'labels_{width}.npy'), labels)
+        shards[str(width)] = count
+    
+    meta = {'signature': signature, 'shards': shards}
+    with open(os.path.join(out_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    
+    return meta
+
+def load_compiled_dataset(data_dir):
+    """Open compiled shards read-only as {width: (images, labels)}
+    
+    A missing or stale compiled dataset is rebuilt first. Returns None when
+    the split has no annotations.json.
+    """
+    out_dir = os.path.join(data_dir, Config.COMPILED_DIR_NAME)
+    meta_file = os.path.join(out_dir, 'meta.json')
+    
+    meta = None
+    if os.path.exists(meta_file):
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    
+    if meta is None or meta['signature'] != compiled_signature(data_dir):
+        print(f" Compiled dataset in {out_dir} is missing or stale, recompiling...")
+        meta = compile_dataset(data_dir)
+        if meta is None:
+            return None
+    
+    shards = {}
+    for width, count in meta['shards'].items():
+        if count == 0:
+            continue
+        images = np.load(os.path.join(out_dir, f'images_{width}.npy'), mmap_mode='r')
+        labels = np.load(os.path.join(out_dir, f'labels_{width}.npy'), mmap_mode='r')
+        shards[int(width)] = (images[:count], labels)
+    
+    return shards
+
+# Per-process generator used by DataGenerator worker pools
+_worker_generator = None
+
+def _init_worker(data_dir, batch_size, augment, compiled, profile=False):
+    global _worker_generator
+    _worker_generator = DataGenerator(data_dir, batch_size, augment, compiled=compiled, workers=0, profile=profile)
+
+def _build_worker_batch(batch, seed):
+    images, labels = _worker_generator.build_batch(batch, seed)
+    return images, labels, _worker_generator.timer.reset()
 
 class DataGenerator(tf.keras.utils.Sequence):
-    def __init__(self, data_dir, batch_size=16, augment=False):
+    def __init__(self, data_dir, batch_size=16, augment=False, compiled=None, workers=None, shuffle=False,
+                 profile=False):
         self.data_dir = data_dir
         self.batch_size = batch_size
         self.augment = augment
+        self.timer = StageTimer(enabled=profile)
         self.samples = self.load_annotations()
-        self.indexes = np.arange(len(self.samples))
+        
+        # Memory-mapped shards from compile_dataset(), if enabled and up to date
+        self.compiled = None
+        if Config.USE_COMPILED_DATASET if compiled is None else compiled:
+            self.compiled = load_compiled_dataset(data_dir)
+        
+        if self.compiled is None:
+            self.buckets = [self.sample_bucket(sample) for sample in self.samples]
+        self.epoch = 0
+        self.batches = self.build_batches(shuffle=shuffle)
         
         if self.augment:
-            self.augmentor = A.Compose([
-                A.RandomBrightnessContrast(brightness_limit=0.2, contrast_limit=0.2, p=0.5),
-                A.GaussNoise(var_limit=(10, 50), p=0.3),
-                A.Rotate(limit=5, p=0.3),
-                A.ElasticTransform(alpha=1, sigma=50, p=0.2),
-            ])
+            self.augmentor = build_augmentor()
+        
+        # Worker processes build the next PREFETCH_BATCHES batches ahead of time
+        self.workers = Config.DATA_WORKERS if workers is None else workers
+        self.pool = None
+        self.pending = {}
+        if self.workers > 0:
+            self.pool = multiprocessing.get_context('spawn').Pool(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(data_dir, batch_size, augment, self.compiled is not None, profile)
+            )
     
     def load_annotations(self):
         """Load annotations.json created by build_annotations.py"""
-        annotation_file = os.path.join(self.data_dir, 'annotations.json')
+        return load_annotations(self.data_dir)
+    
+    def sample_bucket(self, sample):
+        return sample_bucket(self.data_dir, sample)
+    
+    def build_batches(self, shuffle=False):
+        """Split sample indexes into batches that never mix width buckets"""
+        rng = np.random.RandomState(np.random.SeedSequence([Config.DATA_SEED, self.epoch]).generate_state(1)[0])
         
-        if not os.path.exists(annotation_file):
-            print(f" Error: {annotation_file} not found!")
-            return []
+        if self.compiled is not None:
+            # Contiguous (width, start, stop) slices of the shards
+            batches = []
+            for width, (images, _) in sorted(self.compiled.items()):
+                for start in range(0, len(images), self.batch_size):
+                    batches.append((width, start, min(start + self.batch_size, len(images))))
+            if shuffle:
+                rng.shuffle(batches)
+            return batches
         
-        with open(annotation_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        groups = {}
+        for i, bucket in enumerate(self.buckets):
+            groups.setdefault(bucket, []).append(i)
         
-        return data
+        batches = []
+        for bucket in sorted(groups):
+            indexes = np.array(groups[bucket])
+            if shuffle:
+                rng.shuffle(indexes)
+            for start in range(0, len(indexes), self.batch_size):
+                batches.append(indexes[start:start + self.batch_size])
+        
+        if shuffle:
+            rng.shuffle(batches)
+        return batches
     
     def __len__(self):
-        return int(np.ceil(len(self.samples) / self.batch_size))
+        return len(self.batches)
     
     def __getitem__(self, index):
         """Return batch as dictionary for training model with 2 inputs"""
-        indexes = self.indexes[index * self.batch_size:(index + 1) * self.batch_size]
-        batch_samples = [self.samples[i] for i in indexes]
-        
-        images, labels = self.generate_batch(batch_samples)
+        with self.timer.stage('fetch'):
+            if self.pool is not None:
+                images, labels = self.prefetched_batch(index)
+            else:
+                images, labels = self.build_batch(self.batches[index], self.batch_seed(index))
         
         # Return as dictionary with both inputs for the training model
         return {"image": images, "label": labels}, np.zeros((len(images),))
     
-    def generate_batch(self, batch_samples):
-        images, labels = [], []
+    def batch_seed(self, index):
+        """Augmentation seed of a batch, independent of which worker builds it"""
+        return int(np.random.SeedSequence([Config.DATA_SEED, self.epoch, index]).generate_state(1)[0])
+    
+    def build_batch(self, batch, seed=None):
+        """Build (images, labels) for one entry of self.batches
+        
+        albumentations draws from the global `random` and `np.random`
+        generators, so a seeded batch seeds them only while it is built and
+        puts the caller's generator state back afterwards.
+        """
+        if not (self.augment and seed is not None):
+            return self._build_batch(batch)
+        
+        state = random.getstate(), np.random.get_state()
+        random.seed(seed)
+        np.random.seed(seed)
+        try:
+            return self._build_batch(batch)
+        finally:
+            random.setstate(state[0])
+            np.random.set_state(state[1])
+    
+    def _build_batch(self, batch):
+        if self.compiled is not None:
+            return self.compiled_batch(*batch)
+        return self.generate_batch([self.samples[i] for i in batch], self.buckets[batch[0]] if len(batch) else None)
+    
+    def prefetched_batch(self, index):
+        """Wait for batch `index` and queue the following ones on the pool"""
+        last = min(index + Config.PREFETCH_BATCHES, len(self.batches) - 1)
+        for ahead in range(index, last + 1):
+            if ahead not in self.pending:
+                self.pending[ahead] = self.pool.apply_async(
+                    _build_worker_batch, (self.batches[ahead], self.batch_seed(ahead))
+                )
+        
+        # Drop anything requested out of order that will not be used
+        for stale in [i for i in self.pending if i < index]:
+            del self.pending[stale]
+        
+        images, labels, stage_times = self.pending.pop(index).get()
+        # Stage times measured inside the worker that built this batch
+        self.timer.merge(stage_times)
+        return images, labels
+    
+    def generate_batch(self, batch_samples, width=None):
+        """Images and labels of `batch_samples`, resized to the batch's bucket `width`"""
+        images, texts = [], []
         
         for sample in batch_samples:
             img_path = os.path.join(self.data_dir, sample['image'])
             text = sample['text']
             
-            img = preprocess_image(img_path)
+            with self.timer.stage('decode'):
+                img = preprocess_image(img_path, width)
             if img is None:
                 continue
             
             if self.augment:
-                img = self.augmentor(image=(img*255).astype(np.uint8))['image']
-                img = img.astype(np.float32) / 255.0
-            
-            encoded = encode_text(text)
-            if len(encoded) > Config.MAX_TEXT_LENGTH:
-                encoded = encoded[:Config.MAX_TEXT_LENGTH]
-            
-            padded = np.pad(encoded, (0, Config.MAX_TEXT_LENGTH - len(encoded)), constant_values=0)
+                with self.timer.stage('augment'):
+                    img = self.augmentor(image=(img*255).astype(np.uint8))['image']
+                    img = img.astype(np.float32) / 255.0
             
             images.append(img)
-            labels.append(padded)
+            texts.append(text)
         
-        return np.array(images), np.array(labels)
+        with self.timer.stage('encode'):
+            labels, _ = encode_batch(texts)
+        return np.array(images), labels
+    
+    def compiled_batch(self, width, start, stop):
+        images, labels = self.compiled[width]
+        batch = images[start:stop]  # zero-copy view into the memory map
+        
+        if self.augment:
+            with self.timer.stage('augment'):
+                batch = np.stack([self.augmentor(image=img)['image'] for img in batch])
+        
+        # Labels are pre-encoded, so 'decode' is just reading the shard pages
+        with self.timer.stage('decode'):
+            batch = batch.reshape(stop - start, Config.IMG_HEIGHT, width, 1).astype(np.float32) / 255.0
+            labels = np.asarray(labels[start:stop])
+        return batch, labels
     
     def on_epoch_end(self):
-        np.random.shuffle(self.indexes)
\ No newline at end of file
+        self.epoch += 1
+        self.pending = {}
+        self.batches = self.build_batches(shuffle=True)
+    
+    def close(self):
+        """Stop the worker pool, if any"""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+        self.pending = {}
+
+def make_tf_dataset(data_dir, batch_size=16, augment=False, shuffle=False, cache=None):
+    """tf.data alternative to DataGenerator
+    
+    Decoding, resizing and augmentation run in parallel map calls and
+    batches are prefetched. `cache` is None (off), 'memory', or a directory
+    for on-disk cache files; decoded and resized images are cached, so
+    augmentation still differs every epoch.
+    """
+    samples = load_annotations(data_dir)
+    paths = [os.path.join(data_dir, sample['image']) for sample in samples]
+    labels, _ = encode_batch([sample['text'] for sample in samples])
+    
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    ds = ds.map(_load_tf_image, num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.ignore_errors()
+    
+    if cache == 'memory':
+        ds = ds.cache()
+    elif cache:
+        os.makedirs(cache, exist_ok=True)
+        ds = ds.cache(os.path.join(cache, os.path.basename(os.path.normpath(data_dir))))
+    
+    if shuffle:
+        ds = ds.shuffle(max(len(samples), 1), reshuffle_each_iteration=True)
+    
+    if augment:
+        augmentor = build_augmentor()
+        
+        def apply_augmentor(img):
+            img = augmentor(image=(img * 255).astype(np.uint8))['image']
+            return img.astype(np.float32) / 255.0
+        
+        def augment_fn(img, label):
+            out = tf.numpy_function(apply_augmentor, [img], tf.float32)
+            out.set_shape(img.shape)
+            return out, label
+        
+        ds = ds.map(augment_fn, num_parallel_calls=tf.data.AUTOTUNE)
+    
+    if Config.RESIZE_MODE == 'bucket':
+        ds = ds.group_by_window(
+            key_func=lambda img, label: tf.cast(tf.shape(img)[1], tf.int64),
+            reduce_func=lambda key, window: window.batch(batch_size),
+            window_size=batch_size
+        )
+    else:
+        ds = ds.batch(batch_size)
+    
+    ds = ds.map(lambda img, label: ({"image": img, "label": label}, tf.zeros(tf.shape(img)[0])))
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+def _load_tf_image(path, label):
+    """Graph version of preprocess_image"""
+    img = tf.io.decode_image(tf.io.read_file(path), channels=1, expand_animations=False)
+    img = tf.image.convert_image_dtype(img, tf.float32)
+    
+    if Config.RESIZE_MODE != 'bucket':
+        img = tf.image.resize(img, (Config.IMG_HEIGHT, Config.IMG_WIDTH))
+        img.set_shape((Config.IMG_HEIGHT, Config.IMG_WIDTH, 1))
+        return img, label
+    
+    shape = tf.cast(tf.shape(img), tf.float32)
+    scaled = tf.cast(tf.round(shape[1] * Config.IMG_HEIGHT / tf.maximum(shape[0], 1.0)), tf.int32)
+    buckets = tf.constant(Config.WIDTH_BUCKETS, dtype=tf.int32)
+    fits = tf.boolean_mask(buckets, buckets >= scaled)
+    bucket = tf.cond(tf.size(fits) > 0, lambda: fits[0], lambda: buckets[-1])
+    scaled = tf.clip_by_value(scaled, 1, bucket)
+    
+    img = tf.image.resize(img, (Config.IMG_HEIGHT, scaled))
+    # Pad with white on the right, like resize_to_bucket
+    img = 1.0 - tf.image.pad_to_bounding_box(1.0 - img, 0, 0, Config.IMG_HEIGHT, bucket)
+    img.set_shape((Config.IMG_HEIGHT, None, 1))
+    return img, label
\ No newline at end of file
@@ -0,0 +1,191 @@
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+import json
+import time
+import numpy as np
+from config import Config
+from src.utils import encode_text
+
+NEG_INF = float('-inf')
+
+class CharNgramLM:
+    """Character n-gram language model over class indices
+    
+    Stupid backoff (Brants et al., 2007): the relative frequency under the
+    longest context that saw the character, times `alpha` for every order
+    backed off, down to an add-k smoothed unigram. Scores are not
+    normalized over the alphabet, which is fine for ranking beams but means
+    they are not log probabilities.
+    """
+    
+    def __init__(self, order=3, k=0.1, alpha=0.4):
+        self.order = order
+        self.k = k
+        self.alpha = alpha
+        self.vocab_size = len(Config.IDX_TO_CHAR)
+        self.counts = {}
+        self.totals = {}
+        self._cache = {}
+    
+    @classmethod
+    def from_annotations(cls, annotation_files, order=3, k=0.1, alpha=0.4):
+        """Build a model from one or more annotations.json files"""
+        if isinstance(annotation_files, str):
+            annotation_files = [annotation_files]
+        
+        lm = cls(order=order, k=k, alpha=alpha)
+        for annotation_file in annotation_files:
+            if not os.path.exists(annotation_file):
+                continue
+            with open(annotation_file, 'r', encoding='utf-8') as f:
+                lm.fit(encode_text(item['text']) for item in json.load(f))
+        return lm
+    
+    def fit(self, sequences):
+        for seq in sequences:
+            for i, idx in enumerate(seq):
+                for n in range(min(i, self.order - 1) + 1):
+                    context = tuple(seq[i - n:i])
+                    counts = self.counts.setdefault(context, {})
+                    counts[idx] = counts.get(idx, 0) + 1
+                    self.totals[context] = self.totals.get(context, 0) + 1
+        self._cache = {}
+    
+    def log_scores(self, prefix):
+        """Log backoff scores of every class after the last order-1 indices of prefix, shape (vocab,)"""
+        context = tuple(prefix[-(self.order - 1):]) if self.order > 1 else ()
+        if context in self._cache:
+            return self._cache[context]
+        
+        scores = np.full(self.vocab_size, self.k)
+        for idx, count in self.counts.get((), {}).items():
+            scores[idx] += count
+        scores /= self.totals.get((), 0) + self.k * self.vocab_size
+        for n in range(1, len(context) + 1):
+            ctx = context[len(context) - n:]
+            scores *= self.alpha
+            for idx, count in self.counts.get(ctx, {}).items():
+                scores[idx] = count / self.totals[ctx]
+        
+        scores = np.log(scores)
+        self._cache[context] = scores
+        return scores
+    
+    def log_prob(self, prefix, idx):
+        """Log backoff score of `idx` after `prefix` (see log_scores)"""
+        return float(self.log_scores(prefix)[idx])
+
+class CTCBeamSearchDecoder:
+    """CTC prefix beam search with optional character LM
+    
+    At each time step only the `beam_width` most likely characters with
+    probability above `prune_threshold` are expanded, and every beam x
+    character extension is scored as one array. The wall time of the last
+    decode() call is kept in `last_latency` (seconds).
+    """
+    
+    def __init__(self, beam_width=10, prune_threshold=1e-3, lm=None, lm_weight=0.5, insertion_bonus=0.0):
+        self.beam_width = beam_width
+        self.prune_threshold = prune_threshold
+        self.lm = lm
+        self.lm_weight = lm_weight
+        self.insertion_bonus = insertion_bonus
+        self.last_latency = 0.0
+    
+    def decode(self, prediction):
+        """Decode (N, T, C) softmax output into a list of strings"""
+        start = time.perf_counter()
+        texts = [self.decode_sequence(probs)[0] for probs in np.asarray(prediction)]
+        self.last_latency = time.perf_counter() - start
+        return texts
+    
+    def candidates(self, probs):
+        """Indices of the characters to expand at one step"""
+        above = np.flatnonzero(probs > self.prune_threshold)
+        if len(above) > self.beam_width:
+            above = above[np.argpartition(probs[above], -self.beam_width)[-self.beam_width:]]
+        if len(above) == 0:
+            above = np.array([int(np.argmax(probs))])
+        return above
+    
+    def decode_sequence(self, probs):
+        """Decode one (T, C) sequence, returning (text, log score)"""
+        blank = probs.shape[1] - 1
+        log_probs = np.log(np.maximum(probs, 1e-12))
+        
+        # Beam i is prefixes[i], with log P ending in blank / non-blank
+        prefixes = [()]
+        p_blank = np.array([0.0])
+        p_non_blank = np.array([NEG_INF])
+        
+        for t in range(log_probs.shape[0]):
+            step = log_probs[t]
+            candidates = self.candidates(probs[t, :blank])
+            last = np.array([prefix[-1] if prefix else -1 for prefix in prefixes])
+            total = np.logaddexp(p_blank, p_non_blank)
+            
+            # Extensions (beam, candidate); a repeated character only extends
+            # the prefix when a blank separates it from the previous one
+            repeat = candidates[None, :] == last[:, None]
+            extended = np.where(repeat, p_blank[:, None], total[:, None]) + step[candidates][None, :]
+            extended += self.insertion_bonus
+            if self.lm is not None:
+                scores = np.stack([self.lm.log_scores(prefix) for prefix in prefixes])
+                extended += self.lm_weight * scores[:, candidates]
+            
+            # Same prefix: ends in blank now, or repeats its last character
+            stay_blank = total + step[blank]
+            stay_non_blank = np.where(repeat.any(axis=1), p_non_blank + step[np.maximum(last, 0)], NEG_INF)
+            
+            # An extension equal to a prefix already in the beam merges into it
+            position = {prefix: i for i, prefix in enumerate(prefixes)}
+            column = {int(idx): j for j, idx in enumerate(candidates)}
+            for i, prefix in enumerate(prefixes):
+                parent = position.get(prefix[:-1]) if prefix else None
+                j = column.get(prefix[-1]) if parent is not None else None
+                if j is not None:
+                    stay_non_blank[i] = np.logaddexp(stay_non_blank[i], extended[parent, j])
+                    extended[parent, j] = NEG_INF
+            
+            scores = np.concatenate([np.logaddexp(stay_blank, stay_non_blank), extended.ravel()])
+            keep = np.flatnonzero(scores > NEG_INF)
+            if len(keep) > self.beam_width:
+                keep = keep[np.argpartition(scores[keep], -self.beam_width)[-self.beam_width:]]
+            
+            beams = len(prefixes)
+            next_prefixes, next_blank, next_non_blank = [], [], []
+            for n in keep:
+                if n < beams:
+                    next_prefixes.append(prefixes[n])
+                    next_blank.append(stay_blank[n])
+                    next_non_blank.append(stay_non_blank[n])
+                else:
+                    i, j = divmod(n - beams, len(candidates))
+                    next_prefixes.append(prefixes[i] + (int(candidates[j]),))
+                    next_blank.append(NEG_INF)
+                    next_non_blank.append(extended[i, j])
+            prefixes, p_blank, p_non_blank = next_prefixes, np.array(next_blank), np.array(next_non_blank)
+        
+        total = np.logaddexp(p_blank, p_non_blank)
+        best = int(np.argmax(total))
+        text = ''.join(Config.IDX_TO_CHAR[idx] for idx in prefixes[best] if idx in Config.IDX_TO_CHAR)
+        return text, float(total[best])
+
+def build_decoder():
+    """Beam search decoder configured by Config, or None for greedy decoding"""
+    if Config.DECODER != 'beam':
+        return None
+    
+    lm = None
+    if Config.LM_ORDER > 0:
+        lm = CharNgramLM.from_annotations(os.path.join(Config.TRAIN_DIR, 'annotations.json'), order=Config.LM_ORDER)
+    
+    return CTCBeamSearchDecoder(
+        beam_width=Config.BEAM_WIDTH,
+        prune_threshold=Config.BEAM_PRUNE_THRESHOLD,
+        lm=lm,
+        lm_weight=Config.LM_WEIGHT
+    )
@@ -0,0 +1,94 @@
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+import argparse
+import numpy as np
+import tensorflow as tf
+from config import Config
+from src.utils import preprocess_image
+from src.data_preprocessing import load_annotations
+
+FORMATS = ['tflite-fp16', 'tflite-int8', 'onnx']
+
+def input_signature(model, batch_size=None):
+    """Fixed height, free batch size (and width for bucketed models)"""
+    _, height, width, channels = model.input_shape
+    return [tf.TensorSpec((batch_size, height, width, channels), tf.float32, name='image')]
+
+def representative_dataset(data_dir=Config.VAL_DIR, num_samples=100):
+    """Calibration images for int8 quantization, taken from the val split"""
+    samples = load_annotations(data_dir)[:num_samples]
+    
+    def generator():
+        for sample in samples:
+            img = preprocess_image(os.path.join(data_dir, sample['image']))
+            if img is not None:
+                yield [np.expand_dims(img, axis=0)]
+    
+    return generator
+
+def export_tflite(model, output_path, quantization='fp16', calibration_dir=Config.VAL_DIR, num_samples=100):
+    """Convert the prediction model to TFLite with float16 or int8 post-training quantization"""
+    # A static batch dimension lets the LSTMs convert to fused builtin ops;
+    # the interpreter still resizes the input to any batch size at run time
+    signature = input_signature(model, batch_size=1)
+    concrete = tf.function(lambda image: model(image, training=False)).get_concrete_function(*signature)
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    
+    if quantization == 'fp16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        # Weights and activations in int8; ops without an int8 kernel stay float
+        converter.representative_dataset = representative_dataset(calibration_dir, num_samples)
+    else:
+        raise ValueError(f"Unknown quantization '{quantization}'")
+    
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+    return output_path
+
+def export_onnx(model, output_path, opset=13):
+    """Convert the prediction model to ONNX (requires tf2onnx)"""
+    try:
+        import tf2onnx
+    except ImportError:
+        raise ImportError("ONNX export requires: pip install tf2onnx")
+    
+    tf2onnx.convert.from_keras(model, input_signature=input_signature(model), opset=opset, output_path=output_path)
+    return output_path
+
+def export_model(model_path, formats=FORMATS, output_dir=None, num_samples=100):
+    """Export a saved prediction model (.h5) to the requested formats"""
+    model = tf.keras.models.load_model(model_path, compile=False)
+    output_dir = output_dir or os.path.dirname(model_path)
+    base = os.path.join(output_dir, os.path.splitext(os.path.basename(model_path))[0])
+    
+    exported = []
+    for fmt in formats:
+        if fmt == 'tflite-fp16':
+            path = export_tflite(model, f'{base}_fp16.tflite', 'fp16')
+        elif fmt == 'tflite-int8':
+            path = export_tflite(model, f'{base}_int8.tflite', 'int8', num_samples=num_samples)
+        elif fmt == 'onnx':
+            path = export_onnx(model, f'{base}.onnx')
+        else:
+            raise ValueError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+        
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f" {fmt}: {path} ({size_mb:.1f} MB)")
+        exported.append(path)
+    
+    return exported
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a trained model to TFLite / ONNX")
+    parser.add_argument('model_path', help="prediction model saved by train.py (.h5)")
+    parser.add_argument('--formats', nargs='+', default=FORMATS, choices=FORMATS)
+    parser.add_argument('--output-dir', default=None)
+    parser.add_argument('--calibration-samples', type=int, default=100)
+    args = parser.parse_args()
+    
+    export_model(args.model_path, args.formats, args.output_dir, args.calibration_samples)
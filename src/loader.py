@@ -0,0 +1,73 @@
+"""
+Background model loading for the web servers
+The app starts serving /health immediately while the runtime is imported,
+the model is loaded and warm-up batches run on a separate thread.
+"""
+
+import os
+import time
+import threading
+from config import Config
+
+class BackgroundLoader:
+    """Load and warm up a BanglaOCRPredictor without blocking startup
+    
+    `status` goes 'loading' -> 'ready' (or 'error'), or is 'missing' when
+    the model file does not exist. `predictor` is None until ready, and
+    `on_ready(loader)` is called once it is set.
+    """
+    
+    def __init__(self, model_path, warmup_runs=None, on_ready=None, **predictor_kwargs):
+        self.model_path = model_path
+        self.on_ready = on_ready
+        self.warmup_runs = Config.WARMUP_RUNS if warmup_runs is None else warmup_runs
+        self.predictor_kwargs = predictor_kwargs
+        self.predictor = None
+        self.status = 'loading' if os.path.exists(model_path) else 'missing'
+        self.error = None
+        self.timings = {}
+        self.ready = threading.Event()
+    
+    def start(self):
+        if self.status == 'loading':
+            threading.Thread(target=self._load, name='model-loader', daemon=True).start()
+        else:
+            print(f"Warning: Model not found at {self.model_path}")
+            print("Please train the model first or set MODEL_DIR / MODEL_VERSION")
+        return self
+    
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            # Imported here so the server process starts without TensorFlow
+            from src.predict import BanglaOCRPredictor
+            predictor = BanglaOCRPredictor(self.model_path, **self.predictor_kwargs)
+            predictor.warmup(self.warmup_runs)
+        except Exception as e:
+            self.status, self.error = 'error', str(e)
+            self.timings['total'] = time.perf_counter() - start
+            self.ready.set()
+            print(f"Error loading model: {e}")
+            return
+        
+        self.timings.update(predictor.load_timings)
+        self.timings['total'] = time.perf_counter() - start
+        self.predictor = predictor
+        self.status = 'ready'
+        if self.on_ready is not None:
+            self.on_ready(self)
+        self.ready.set()
+        print("Model loaded successfully! " + ', '.join(
+            f"{stage}: {seconds:.2f}s" for stage, seconds in self.timings.items()))
+    
+    def health(self):
+        info = {
+            'status': self.status,
+            'model_loaded': self.predictor is not None,
+            'startup_seconds': {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+        }
+        if self.error:
+            info['error'] = self.error
+        if self.predictor is not None and self.predictor.cache is not None:
+            info['cache'] = self.predictor.cache.stats()
+        return info
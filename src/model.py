@@ -6,48 +6,152 @@ import tensorflow as tf
 from tensorflow.keras import layers, Model
 from config import Config
 
-def build_crnn_model():
-    input_img = layers.Input(shape=(Config.IMG_HEIGHT, Config.IMG_WIDTH, 1), name='image')
+class CTCLayer(tf.keras.layers.Layer):
+    """Custom CTC layer for training"""
     
-    # CNN Feature Extraction
-    x = layers.Conv2D(64, (3, 3), activation='relu', padding='same')(input_img)
-    x = layers.MaxPooling2D((2, 2))(x)  # 64 -> 32, 512 -> 256
-    
-    x = layers.Conv2D(128, (3, 3), activation='relu', padding='same')(x)
-    x = layers.MaxPooling2D((2, 2))(x)  # 32 -> 16, 256 -> 128
-    
-    x = layers.Conv2D(256, (3, 3), activation='relu', padding='same')(x)
-    x = layers.BatchNormalization()(x)
-    x = layers.MaxPooling2D((2, 2))(x)  # 16 -> 8, 128 -> 64
+    def __init__(self, name=None, **kwargs):
+        super().__init__(name=name, **kwargs)
+        
+    def call(self, y_true, y_pred):
+        # Get batch size
+        batch_len = tf.cast(tf.shape(y_true)[0], dtype="int32")
+        
+        # Input length is the time dimension of predictions
+        input_length = tf.cast(tf.shape(y_pred)[1], dtype="int32")
+        input_length = input_length * tf.ones(shape=(batch_len,), dtype="int32")
+        
+        # Label length - count non-zero elements in each label
+        label_length = tf.cast(tf.reduce_sum(tf.cast(y_true != 0, dtype="int32"), axis=1), dtype="int32")
+        
+        # Compute CTC loss
+        loss = tf.nn.ctc_loss(
+            labels=tf.cast(y_true, dtype="int32"),
+            logits=y_pred,
+            label_length=label_length,
+            logit_length=input_length,
+            logits_time_major=False,
+            blank_index=-1
+        )
+        
+        # Add loss to layer
+        self.add_loss(tf.reduce_mean(loss))
+        
+        # Return predictions unchanged
+        return y_pred
+
+# Named backbones for Config.MODEL_VARIANT
+# conv: 'standard' or 'separable' (depthwise-separable after the first layer)
+# channels: filters of the five conv blocks
+# head: sequence model over the time steps, 'bilstm', 'bigru' or 'conv1d'
+MODEL_VARIANTS = {
+    'crnn': {'conv': 'standard', 'channels': (64, 128, 256, 512, 512), 'head': 'bilstm', 'units': 256},
+    'separable': {'conv': 'separable', 'channels': (64, 128, 256, 512, 512), 'head': 'bilstm', 'units': 256},
+    'separable_gru': {'conv': 'separable', 'channels': (32, 64, 128, 256, 256), 'head': 'bigru', 'units': 128},
+    'separable_conv1d': {'conv': 'separable', 'channels': (32, 64, 128, 256, 256), 'head': 'conv1d', 'units': 256},
+}
+
+# (pool size, batch norm) after each conv block: height 64 -> 4, width / 8
+CONV_BLOCKS = [((2, 2), False), ((2, 2), False), ((2, 2), True), ((2, 1), True), (None, False)]
+
+def time_pool_factor():
+    """How much the time axis is pooled beyond the CNN's width / 8"""
+    steps = Config.IMG_WIDTH // 8
+    if Config.TIME_STEPS is None or Config.TIME_STEPS >= steps:
+        return 1
+    if steps % Config.TIME_STEPS:
+        raise ValueError(f"TIME_STEPS must divide IMG_WIDTH // 8 = {steps}")
+    return steps // Config.TIME_STEPS
+
+def sequence_head(x, head, units):
+    if head == 'bilstm':
+        x = layers.Bidirectional(layers.LSTM(units, return_sequences=True, dropout=0.2))(x)
+        x = layers.Bidirectional(layers.LSTM(units, return_sequences=True, dropout=0.2))(x)
+    elif head == 'bigru':
+        x = layers.Bidirectional(layers.GRU(units, return_sequences=True, dropout=0.2))(x)
+        x = layers.Bidirectional(layers.GRU(units, return_sequences=True, dropout=0.2))(x)
+    elif head == 'conv1d':
+        # Dilations 1, 2, 4 give each step a receptive field of 15 steps
+        for dilation in (1, 2, 4):
+            x = layers.Conv1D(units, 3, padding='same', dilation_rate=dilation, activation='relu')(x)
+            x = layers.Dropout(0.2)(x)
+    else:
+        raise ValueError(f"Unknown sequence head '{head}'")
+    return x
+
+def build_crnn_model(variant=None):
+    """Prediction model for Config.MODEL_VARIANT (or `variant`), see MODEL_VARIANTS"""
+    variant = variant or Config.MODEL_VARIANT
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Unknown model variant '{variant}', expected one of {sorted(MODEL_VARIANTS)}")
+    spec = MODEL_VARIANTS[variant]
     
-    x = layers.Conv2D(512, (3, 3), activation='relu', padding='same')(x)
-    x = layers.BatchNormalization()(x)
-    x = layers.MaxPooling2D((2, 1))(x)  # 8 -> 4, 64 -> 64
+    # Bucketed inputs have variable width, so the time axis follows the width
+    bucketed = Config.RESIZE_MODE == 'bucket'
+    width = None if bucketed else Config.IMG_WIDTH
+    input_img = layers.Input(shape=(Config.IMG_HEIGHT, width, 1), name='image')
     
-    x = layers.Conv2D(512, (3, 3), activation='relu', padding='same')(x)
+    # CNN Feature Extraction
+    x = input_img
+    for i, (filters, (pool, batch_norm)) in enumerate(zip(spec['channels'], CONV_BLOCKS)):
+        if spec['conv'] == 'separable' and i > 0:
+            x = layers.SeparableConv2D(filters, (3, 3), activation='relu', padding='same')(x)
+        else:
+            x = layers.Conv2D(filters, (3, 3), activation='relu', padding='same')(x)
+        if batch_norm:
+            x = layers.BatchNormalization()(x)
+        if pool is not None:
+            x = layers.MaxPooling2D(pool)(x)
     
-    # Calculate shape after convolutions
     # Input: 64 x 512 x 1
-    # After pooling: 4 x 64 x 512
-    # Reshape to: (64, 2048) where 2048 = 4 * 512
+    # After pooling: 4 x 64 x C
+    # Reshape to: (64, 4 * C)
+    features = 4 * spec['channels'][-1]
+    if bucketed or variant != 'crnn':
+        # (4, W/8, C) -> (W/8, 4, C) -> (W/8, 4C): one time step per column
+        x = layers.Permute((2, 1, 3))(x)
+        x = layers.Reshape(target_shape=(-1, features))(x)
+    else:
+        # Kept as originally trained so existing 'crnn' checkpoints stay compatible
+        x = layers.Reshape(target_shape=(Config.IMG_WIDTH // 8, features))(x)
     
-    x = layers.Reshape(target_shape=(64, 2048))(x)
+    factor = time_pool_factor()
+    if factor > 1:
+        x = layers.AveragePooling1D(factor)(x)
     x = layers.Dense(64, activation='relu')(x)
     
-    # Bidirectional LSTM
-    x = layers.Bidirectional(layers.LSTM(256, return_sequences=True, dropout=0.2))(x)
-    x = layers.Bidirectional(layers.LSTM(256, return_sequences=True, dropout=0.2))(x)
+    x = sequence_head(x, spec['head'], spec['units'])
     
-    # Output layer
-    output = layers.Dense(Config.NUM_CLASSES, activation='softmax')(x)
+    # Output layer (float32 even under mixed precision, for a stable softmax and CTC loss)
+    output = layers.Dense(Config.NUM_CLASSES, activation='softmax', dtype='float32')(x)
     
-    return Model(inputs=input_img, outputs=output, name='CRNN_Bangla_OCR')
+    name = 'CRNN_Bangla_OCR' if variant == 'crnn' else f'CRNN_Bangla_OCR_{variant}'
+    return Model(inputs=input_img, outputs=output, name=name)
 
-def build_training_model():
-    from src.utils import CTCLayer
-    
-    base_model = build_crnn_model()
+def build_training_model(variant=None):
+    base_model = build_crnn_model(variant)
     labels = layers.Input(name='label', shape=(Config.MAX_TEXT_LENGTH,), dtype='float32')
-    output = CTCLayer(name='ctc_loss')(labels, base_model.output)
+    output = CTCLayer(name='ctc_loss', dtype='float32')(labels, base_model.output)
+    
+    return Model(inputs=[base_model.input, labels], outputs=output), base_model
+
+def apply_precision_policy(policy=None):
+    """Set the global Keras dtype policy (Config.MIXED_PRECISION, default float32)
+    
+    Call before building models. 'mixed_bfloat16' is the one that speeds up
+    CPUs with bf16 support; 'mixed_float16' targets GPUs.
+    """
+    policy = policy or Config.MIXED_PRECISION or 'float32'
+    tf.keras.mixed_precision.set_global_policy(policy)
+    return policy
+
+def build_float16_model(pred_model, variant=None):
+    """Pure float16 copy of a trained prediction model for export (softmax stays float32)"""
+    previous = tf.keras.mixed_precision.global_policy()
+    tf.keras.mixed_precision.set_global_policy('float16')
+    try:
+        model = build_crnn_model(variant)
+    finally:
+        tf.keras.mixed_precision.set_global_policy(previous)
     
-    return Model(inputs=[base_model.input, labels], outputs=output), base_model
\ No newline at end of file
+    model.set_weights(pred_model.get_weights())
+    return model
\ No newline at end of file
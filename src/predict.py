@@ -1,37 +1,256 @@
-import tensorflow as tf
+import time
 import numpy as np
 from config import Config
-from src.utils import preprocess_image, decode_prediction
+from src.utils import load_image, preprocess_image, decode_batch, sequence_confidence
+from src.segmentation import segment_lines
+from src.decoder import build_decoder
+from src.backends import load_backend
+from src.cache import ResultCache, model_version
 
 class BanglaOCRPredictor:
-    def __init__(self, model_path):
+    def __init__(self, model_path, backend=None, cache=None):
         print(f"Loading: {model_path}")
-        self.model = tf.keras.models.load_model(model_path, compile=False)
-        print("Model loaded!")
+        start = time.perf_counter()
+        self.backend = load_backend(model_path, backend)
+        self.decoder = build_decoder()
+        self.last_timings = {}
+        
+        # Seconds spent importing the runtime and loading the model
+        import_time = getattr(self.backend, 'import_time', 0.0)
+        self.load_timings = {'import': import_time, 'load': time.perf_counter() - start - import_time}
+        
+        # Pass a ResultCache to share one, or enable Config.USE_RESULT_CACHE
+        if cache is None and Config.USE_RESULT_CACHE:
+            cache = ResultCache(model_version(model_path))
+        self.cache = cache
+        print(f"Model loaded! ({self.backend.name})")
     
-    def predict_image(self, image_path):
-        img = preprocess_image(image_path)
+    def warmup(self, runs=None):
+        """Run dummy batches at every input width so tracing happens before real traffic
+        
+        Both a single image and a full PREDICT_BATCH_SIZE batch are run
+        `runs` times per width. Returns the elapsed seconds.
+        """
+        runs = Config.WARMUP_RUNS if runs is None else runs
+        widths = Config.WIDTH_BUCKETS if Config.RESIZE_MODE == 'bucket' else (Config.IMG_WIDTH,)
+        
+        start = time.perf_counter()
+        for width in widths:
+            for batch_size in sorted({1, Config.PREDICT_BATCH_SIZE}):
+                batch = np.ones((batch_size, Config.IMG_HEIGHT, width, 1), dtype=np.float32)
+                for _ in range(runs):
+                    self.decode(self.forward(batch))
+        
+        self.load_timings['warmup'] = time.perf_counter() - start
+        return self.load_timings['warmup']
+    
+    def predict_image(self, image):
+        if self.cache is not None:
+            return self.predict_batch([image])[0]
+        
+        img = preprocess_image(image)
         if img is None:
             return "Error loading image"
         
         img = np.expand_dims(img, axis=0)
-        prediction = self.model.predict(img, verbose=0)
+        prediction = self.forward(img)
         
-        input_len = np.ones(prediction.shape[0]) * prediction.shape[1]
-        results = tf.keras.backend.ctc_decode(prediction, input_length=input_len, greedy=True)[0][0]
+        return self.decode(prediction)[0]
+    
+    def predict_batch(self, inputs, batch_size=None):
+        """Predict text for a list of images (paths, encoded bytes or arrays)
         
-        return decode_prediction(results[0].numpy())
+        Images are grouped by width, run through the model in chunks of
+        `batch_size` and each chunk is CTC-decoded in one call. Per-stage
+        timings (seconds) of the last call are kept in `self.last_timings`.
+        """
+        if self.cache is not None:
+            return self._cached(inputs, 'line', lambda images: self._predict_batch(images, batch_size))
+        return self._predict_batch(inputs, batch_size)
+    
+    def _predict_batch(self, inputs, batch_size=None, scores=None):
+        batch_size = batch_size or Config.PREDICT_BATCH_SIZE
+        timings = {'preprocess': 0.0, 'inference': 0.0, 'decode': 0.0}
+        results = ["Error loading image"] * len(inputs)
+        
+        start = time.perf_counter()
+        images, positions = [], []
+        for i, item in enumerate(inputs):
+            img = preprocess_image(item)
+            if img is not None:
+                images.append(img)
+                positions.append(i)
+        timings['preprocess'] = time.perf_counter() - start
+        
+        # Only images of the same width can share a batch
+        groups = {}
+        for img, pos in zip(images, positions):
+            groups.setdefault(img.shape[1], []).append((img, pos))
+        
+        for group in groups.values():
+            for offset in range(0, len(group), batch_size):
+                chunk = group[offset:offset + batch_size]
+                batch = np.stack([img for img, _ in chunk])
+                
+                start = time.perf_counter()
+                # Confidence needs the probabilities, not in-graph decoded labels
+                prediction = self.forward(batch) if scores is None else self.backend.predict(batch)
+                timings['inference'] += time.perf_counter() - start
+                
+                start = time.perf_counter()
+                for text, (_, pos) in zip(self.decode(prediction), chunk):
+                    results[pos] = text
+                if scores is not None:
+                    for score, (_, pos) in zip(sequence_confidence(prediction), chunk):
+                        scores[pos] = score
+                timings['decode'] += time.perf_counter() - start
+        
+        timings['total'] = timings['preprocess'] + timings['inference'] + timings['decode']
+        timings['images'] = len(images)
+        self.last_timings = timings
+        
+        return results
+
+    def forward(self, batch):
+        """Run the model on a preprocessed batch
+        
+        With the greedy decoder and a backend that decodes in-graph this
+        returns collapsed (N, T) label rows, otherwise (N, T, C) probabilities.
+        """
+        if self.decoder is None and hasattr(self.backend, 'predict_decoded'):
+            return self.backend.predict_decoded(batch)
+        return self.backend.predict(batch)
+    
+    def decode(self, prediction):
+        """CTC-decode a batch of forward() outputs with the configured decoder"""
+        if self.decoder is None:
+            return decode_batch(prediction, collapse=np.ndim(prediction) == 3)
+        return self.decoder.decode(prediction)
+    
+    def predict_paragraphs(self, inputs, batch_size=None):
+        """Predict text for paragraph images, one line per output row
+        
+        Every page is split into lines, the lines of all pages are batched
+        together and the results are joined back in reading order.
+        """
+        if self.cache is not None:
+            return self._cached(inputs, 'paragraph', lambda images: self._predict_paragraphs(images, batch_size))
+        return self._predict_paragraphs(inputs, batch_size)
+    
+    def _predict_paragraphs(self, inputs, batch_size=None, scores=None):
+        start = time.perf_counter()
+        lines, owners = [], []
+        for i, item in enumerate(inputs):
+            img = load_image(item)
+            if img is None:
+                continue
+            for line in segment_lines(img):
+                lines.append(line)
+                owners.append(i)
+        segment_time = time.perf_counter() - start
+        
+        line_scores = None if scores is None else [0.0] * len(lines)
+        line_texts = self._predict_batch(lines, batch_size=batch_size, scores=line_scores)
+        self.last_timings['segment'] = segment_time
+        self.last_timings['total'] += segment_time
+        self.last_timings['lines'] = len(lines)
+        
+        pages = [[] for _ in inputs]
+        for owner, text in zip(owners, line_texts):
+            pages[owner].append(text)
+        
+        if scores is not None:
+            # A page is only as reliable as its least confident line
+            for owner in set(owners):
+                scores[owner] = 1.0
+            for owner, score in zip(owners, line_scores):
+                scores[owner] = min(scores[owner], score)
+        
+        return ['\n'.join(page) if page else "Error loading image" for page in pages]
+    
+    def predict_paragraph(self, image):
+        return self.predict_paragraphs([image])[0]
+    
+    def predict_with_confidence(self, inputs, paragraphs=False, batch_size=None):
+        """(text, confidence) per image, bypassing the result cache
+        
+        Confidence is the best-path probability per time step (geometric
+        mean, see sequence_confidence), 0.0 for unreadable images; pages
+        score as their least confident line.
+        """
+        scores = [0.0] * len(inputs)
+        if paragraphs:
+            texts = self._predict_paragraphs(inputs, batch_size, scores=scores)
+        else:
+            texts = self._predict_batch(inputs, batch_size, scores=scores)
+        return list(zip(texts, scores))
+    
+    def _cached(self, inputs, kind, predict):
+        """Serve what the result cache has and run `predict` on decoded misses"""
+        start = time.perf_counter()
+        images = [load_image(item) for item in inputs]
+        results = ["Error loading image"] * len(inputs)
+        misses = []
+        hits = 0
+        for i, img in enumerate(images):
+            if img is None:
+                continue
+            key = self.cache.key(img, kind)
+            text = self.cache.get(key)
+            if text is None:
+                misses.append((i, key))
+            else:
+                results[i] = text
+                hits += 1
+        lookup_time = time.perf_counter() - start
+        
+        self.last_timings = {'preprocess': 0.0, 'inference': 0.0, 'decode': 0.0, 'total': 0.0, 'images': 0}
+        if misses:
+            texts = predict([images[i] for i, _ in misses])
+            for (i, key), text in zip(misses, texts):
+                results[i] = text
+                if text != "Error loading image":
+                    self.cache.put(key, text)
+        
+        self.last_timings['cache'] = lookup_time
+        self.last_timings['total'] += lookup_time
+        self.last_timings['cache_hits'] = hits
+        return results
 
 def test_prediction(model_path, image_path):
     predictor = BanglaOCRPredictor(model_path)
-    result = predictor.predict_image(image_path)
+    if Config.SEGMENT_LINES:
+        result = predictor.predict_paragraph(image_path)
+    else:
+        result = predictor.predict_image(image_path)
     print(f"\nImage: {image_path}")
     print(f"Predicted: {result}")
     return result
 
+def test_batch_prediction(model_path, image_paths):
+    predictor = BanglaOCRPredictor(model_path)
+    if Config.SEGMENT_LINES:
+        results = predictor.predict_paragraphs(image_paths)
+    else:
+        results = predictor.predict_batch(image_paths)
+    for image_path, result in zip(image_paths, results):
+        print(f"\nImage: {image_path}")
+        print(f"Predicted: {result}")
+    
+    timings = predictor.last_timings
+    print(f"\nTimings for {timings['images']} images:")
+    for stage in ['cache', 'segment', 'preprocess', 'inference', 'decode', 'total']:
+        if stage not in timings:
+            continue
+        print(f"   {stage}: {timings[stage] * 1000:.1f} ms")
+    return results
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) < 3:
-        print("Usage: python predict.py <model_path> <image_path>")
+        print("Usage: python predict.py <model_path> <image_path> [<image_path> ...]")
         sys.exit(1)
-    test_prediction(sys.argv[1], sys.argv[2])
\ No newline at end of file
+    if len(sys.argv) == 3:
+        test_prediction(sys.argv[1], sys.argv[2])
+    else:
+        test_batch_prediction(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,94 @@
+"""
+Model-assisted pre-labeling for the labeling tool
+A background thread runs BanglaOCRPredictor over unlabeled items of the
+annotation stores and saves text plus confidence next to each item, working
+ahead of where the labeler is.
+"""
+
+import os
+import time
+import threading
+from config import Config
+from src.cache import model_version
+
+class PrelabelWorker:
+    """Fill predictions in the AnnotationStores returned by `stores()`
+    
+    `stores` is called every round and returns {split: AnnotationStore},
+    so stores opened later are picked up. Predictions from a different
+    model file are discarded and redone. Call hint() with the labeler's
+    position to predict the items right after it first.
+    """
+    
+    def __init__(self, model_path, stores, batch_size=None, paragraphs=None):
+        self.model_path = model_path
+        self.stores = stores
+        self.batch_size = batch_size or Config.PREDICT_BATCH_SIZE
+        self.paragraphs = Config.SEGMENT_LINES if paragraphs is None else paragraphs
+        self.positions = {}
+        self.status = 'loading'
+        self.error = None
+        self.counters = {'predicted': 0, 'seconds': 0.0}
+        self.stop_event = threading.Event()
+    
+    def start(self):
+        threading.Thread(target=self._run, name='prelabel', daemon=True).start()
+        return self
+    
+    def stop(self):
+        self.stop_event.set()
+    
+    def hint(self, split, index):
+        self.positions[split] = index
+    
+    def _run(self):
+        from src.predict import BanglaOCRPredictor
+        
+        try:
+            predictor = BanglaOCRPredictor(self.model_path)
+            version = model_version(self.model_path)
+        except Exception as e:
+            self.status, self.error = 'error', str(e)
+            print(f"Pre-labeling disabled, model failed to load: {e}")
+            return
+        
+        self.status = 'running'
+        reset = set()
+        while not self.stop_event.is_set():
+            busy = False
+            for split, store in list(self.stores().items()):
+                if split not in reset:
+                    store.reset_predictions(version)
+                    reset.add(split)
+                try:
+                    busy |= self._predict_next(predictor, store, self.positions.get(split, 0))
+                except Exception as e:
+                    self.status, self.error = 'error', str(e)
+                    print(f"Pre-labeling stopped: {e}")
+                    return
+            if not busy:
+                self.status = 'idle'
+                self.stop_event.wait(Config.LABEL_PRELABEL_IDLE_SECONDS)
+    
+    def _predict_next(self, predictor, store, position):
+        """Predict one batch of `store`; False when nothing is left to do"""
+        pending = store.unpredicted(self.batch_size, start=position)
+        if not pending:
+            return False
+        
+        self.status = 'running'
+        start = time.perf_counter()
+        paths = [os.path.join(store.split_dir, image) for _, image in pending]
+        results = predictor.predict_with_confidence(paths, paragraphs=self.paragraphs, batch_size=self.batch_size)
+        # Unreadable images get an empty prediction so they are not retried
+        store.set_predictions([(idx, image, text if confidence else '', confidence)
+                               for (idx, image), (text, confidence) in zip(pending, results)])
+        
+        self.counters['predicted'] += len(pending)
+        self.counters['seconds'] += time.perf_counter() - start
+        return True
+    
+    def stats(self):
+        seconds = self.counters['seconds']
+        return {'status': self.status, 'error': self.error, 'model': os.path.basename(self.model_path),
+                **self.counters, 'images_per_sec': self.counters['predicted'] / seconds if seconds else 0.0}
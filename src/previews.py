@@ -0,0 +1,180 @@
+"""
+Derivative image cache for the labeling tool
+Downscaled previews and line crops of the original scans are generated once,
+kept on disk and served with ETags, so a page only waits on a small image.
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+import re
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from config import Config
+from src.utils import load_image
+from src.segmentation import find_line_boxes
+
+FORMATS = {
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY),
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+}
+
+# '<stem>.<version key>' prefix shared by every derivative of one version of a scan
+VERSION_PREFIX = re.compile(r'^(.*\.([0-9a-f]{16}))\.')
+
+def downscale(img, max_width):
+    height, width = img.shape[:2]
+    if width <= max_width:
+        return img
+    return cv2.resize(img, (max_width, max(1, round(height * max_width / width))), interpolation=cv2.INTER_AREA)
+
+class PreviewCache:
+    """Previews and line crops of images, stored in `cache_dir`
+    
+    File names carry a version key hashed from the source's size and mtime
+    and the preview settings, so a replaced scan or a new setting never
+    serves a stale derivative; the key doubles as the HTTP ETag. Once the
+    directory grows past `max_mb`, the least recently used versions are
+    deleted (use is tracked through the mtime of their manifest).
+    """
+    
+    def __init__(self, cache_dir, max_width=None, fmt=None, quality=None, workers=2, max_mb=None):
+        self.cache_dir = cache_dir
+        self.max_width = max_width or Config.LABEL_PREVIEW_WIDTH
+        self.quality = quality or Config.LABEL_PREVIEW_QUALITY
+        self.ext, self.mimetype, self.quality_flag = FORMATS[fmt or Config.LABEL_PREVIEW_FORMAT]
+        max_mb = max_mb or Config.LABEL_PREVIEW_CACHE_MB
+        self.max_bytes = max_mb * 1024 * 1024 if max_mb else None
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='preview')
+        self.lock = threading.Lock()
+        self.trim_lock = threading.Lock()
+        self.building = {}  # version key -> lock held while its derivatives are written
+        os.makedirs(cache_dir, exist_ok=True)
+        self.size = self.trim()
+    
+    def key(self, source):
+        stat = os.stat(source)
+        settings = (os.path.abspath(source), stat.st_size, stat.st_mtime_ns,
+                    self.max_width, self.ext, self.quality, Config.LINE_PROFILE_THRESHOLD,
+                    Config.LINE_MIN_HEIGHT, Config.LINE_MIN_GAP, Config.LINE_MARGIN)
+        return hashlib.blake2b(repr(settings).encode(), digest_size=8).hexdigest()
+    
+    def _path(self, source, key, suffix):
+        stem = os.path.splitext(os.path.basename(source))[0]
+        return os.path.join(self.cache_dir, f'{stem}.{key}{suffix}')
+    
+    def _write(self, path, img):
+        ok, encoded = cv2.imencode(self.ext, img, [self.quality_flag, self.quality])
+        if not ok:
+            raise ValueError(f"Could not encode {path}")
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded.tobytes())
+        os.replace(tmp_path, path)
+        return len(encoded)
+    
+    def build(self, source):
+        """Write the preview and line crops of `source` unless cached; returns the version key"""
+        key = self.key(source)
+        manifest = self._path(source, key, '.lines.json')
+        try:
+            os.utime(manifest)  # marks the version as recently used
+            return key
+        except FileNotFoundError:
+            pass
+        
+        written = 0
+        with self.lock:
+            building = self.building.setdefault(key, threading.Lock())
+        with building:
+            if not os.path.exists(manifest):
+                img = load_image(source)
+                if img is None:
+                    raise ValueError(f"Could not read {source}")
+                written += self._write(self._path(source, key, self.ext), downscale(img, self.max_width))
+                
+                boxes = find_line_boxes(img)
+                for n, (y0, y1, x0, x1) in enumerate(boxes):
+                    written += self._write(self._path(source, key, f'.line{n}{self.ext}'),
+                                           downscale(img[y0:y1, x0:x1], self.max_width))
+                # Written last: its presence means every derivative exists
+                with open(manifest, 'w') as f:
+                    json.dump({'boxes': boxes}, f)
+        with self.lock:
+            self.building.pop(key, None)
+            self.size += written
+            full = self.max_bytes is not None and self.size > self.max_bytes
+        if full:
+            self.size = self.trim()
+        return key
+    
+    def trim(self):
+        """Delete least recently used versions until the cache is below 90% of max_bytes; returns its size"""
+        with self.trim_lock:
+            versions = {}  # prefix -> [last use, bytes, paths]
+            for name in os.listdir(self.cache_dir):
+                match = VERSION_PREFIX.match(name)
+                if match is None:
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                version = versions.setdefault(match.group(1), [0, 0, []])
+                version[0] = max(version[0], stat.st_mtime_ns)
+                version[1] += stat.st_size
+                version[2].append(path)
+            
+            total = sum(size for _, size, _ in versions.values())
+            if self.max_bytes is None or total <= self.max_bytes:
+                return total
+            with self.lock:
+                building = set(self.building)
+            for prefix, (_, size, paths) in sorted(versions.items(), key=lambda item: item[1][0]):
+                if total <= self.max_bytes * 0.9:
+                    break
+                if VERSION_PREFIX.match(prefix + '.').group(2) in building:
+                    continue
+                # Manifest first: a partly deleted version is rebuilt, never served
+                for path in sorted(paths, key=lambda path: not path.endswith('.lines.json')):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+            return total
+    
+    def preview(self, source):
+        """(path, etag) of the downscaled preview"""
+        key = self.build(source)
+        return self._path(source, key, self.ext), key
+    
+    def line(self, source, n):
+        """(path, etag) of line crop `n`, or (None, etag) past the last line"""
+        key = self.build(source)
+        if n >= len(self.boxes(source)):
+            return None, key
+        return self._path(source, key, f'.line{n}{self.ext}'), f'{key}-{n}'
+    
+    def boxes(self, source):
+        """Line boxes (y0, y1, x0, x1) of `source` in reading order"""
+        key = self.build(source)
+        with open(self._path(source, key, '.lines.json')) as f:
+            return json.load(f)['boxes']
+    
+    def prefetch(self, sources):
+        """Build derivatives for `sources` on the worker threads"""
+        for source in sources:
+            self.executor.submit(self._prefetch, source)
+    
+    def _prefetch(self, source):
+        try:
+            self.build(source)
+        except (OSError, ValueError) as e:
+            print(f"Preview failed for {source}: {e}")
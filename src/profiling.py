@@ -0,0 +1,173 @@
+"""
+Training profiler: per-stage timings of the input pipeline and the train step
+Tells whether train_model is input-bound or compute-bound.
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+import time
+from contextlib import contextmanager
+from config import Config
+
+# Input pipeline stages, in the order they run for a sample
+INPUT_STAGES = ['decode', 'augment', 'encode']
+
+class StageTimer:
+    """Accumulates wall time per named stage; a no-op unless enabled"""
+    
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.totals = {}
+    
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+    
+    def add(self, name, seconds):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+    
+    def merge(self, totals):
+        for name, seconds in totals.items():
+            self.add(name, seconds)
+    
+    def reset(self):
+        """Return the totals so far and start over"""
+        totals, self.totals = self.totals, {}
+        return totals
+
+def format_table(rows):
+    """Fixed-width table of per-epoch profile rows (times in ms per step)"""
+    columns = ['epoch', 'steps', 'samples/s', 'step', 'fetch', *INPUT_STAGES, 'bound']
+    lines = ['  '.join(f'{column:>10}' for column in columns)]
+    for row in rows:
+        values = [row['epoch'], row['steps'], f"{row['samples_per_sec']:.1f}", f"{row['step_ms']:.1f}",
+                  f"{row['fetch_ms']:.1f}", *(f"{row['stages_ms'].get(stage, 0.0):.1f}" for stage in INPUT_STAGES),
+                  row['bound']]
+        lines.append('  '.join(f'{value:>10}' for value in values))
+    return '\n'.join(lines)
+
+def profile_row(epoch, steps, samples, elapsed, step_time, input_totals):
+    """One table row of per-step averages
+    
+    Batches are fetched on Keras' enqueuer thread while the previous step
+    runs, so an epoch counts as input-bound once fetching takes more than
+    half of the step time.
+    """
+    steps = max(steps, 1)
+    fetch = input_totals.get('fetch', 0.0)
+    return {
+        'epoch': epoch,
+        'steps': steps,
+        'samples_per_sec': samples / elapsed if elapsed > 0 else 0.0,
+        'step_ms': step_time / steps * 1000,
+        'fetch_ms': fetch / steps * 1000,
+        'stages_ms': {stage: seconds / steps * 1000 for stage, seconds in input_totals.items() if stage != 'fetch'},
+        'bound': 'input' if fetch > 0.5 * step_time else 'compute',
+    }
+
+def make_profiler_callback(generator, samples, log_file=None):
+    """Keras callback timing every train step and reading `generator`'s stage timers
+    
+    `generator` is a DataGenerator built with profile=True, or None for
+    tf.data pipelines (only step time is available there). `samples` is the
+    number of training samples per epoch; batches vary in size (buckets, the
+    last partial batch), so throughput is that count over the time from the
+    start of the epoch to its last train step.
+    """
+    import tensorflow as tf
+    
+    class TrainingProfiler(tf.keras.callbacks.Callback):
+        def __init__(self):
+            super().__init__()
+            self.rows = []
+        
+        def on_epoch_begin(self, epoch, logs=None):
+            self.epoch_start = time.perf_counter()
+            self.step_time = 0.0
+            self.steps = 0
+            self.train_end = self.epoch_start
+            if generator is not None:
+                generator.timer.reset()
+        
+        def on_train_batch_begin(self, batch, logs=None):
+            self.step_start = time.perf_counter()
+        
+        def on_train_batch_end(self, batch, logs=None):
+            self.train_end = time.perf_counter()
+            self.step_time += self.train_end - self.step_start
+            self.steps += 1
+        
+        def on_epoch_end(self, epoch, logs=None):
+            totals = generator.timer.reset() if generator is not None else {}
+            # Validation runs before on_epoch_end and is left out of the throughput
+            row = profile_row(epoch + 1, self.steps, samples,
+                              self.train_end - self.epoch_start, self.step_time, totals)
+            self.rows.append(row)
+            
+            table = format_table(self.rows)
+            print('\n' + table)
+            if log_file:
+                with open(log_file, 'w') as f:
+                    f.write(table + '\n')
+    
+    return TrainingProfiler()
+
+def profile_input_pipeline(data_dir=Config.TRAIN_DIR, batch_size=Config.BATCH_SIZE, max_batches=None, augment=True):
+    """Run the training input pipeline with no model and report its maximum throughput"""
+    from src.data_preprocessing import DataGenerator, make_tf_dataset
+    
+    print(f" Input pipeline: {'tf.data' if Config.USE_TF_DATA else 'DataGenerator'}"
+          f" (workers: {Config.DATA_WORKERS}, compiled: {Config.USE_COMPILED_DATASET})")
+    
+    if Config.USE_TF_DATA:
+        dataset = make_tf_dataset(data_dir, batch_size, augment=augment, shuffle=True, cache=Config.TF_DATA_CACHE)
+        batches = iter(dataset.take(max_batches) if max_batches else dataset)
+        generator, fetch_timer = None, StageTimer(enabled=True)
+    else:
+        generator = DataGenerator(data_dir, batch_size, augment=augment, shuffle=True, profile=True)
+        count = min(len(generator), max_batches or len(generator))
+        batches = (generator[i] for i in range(count))
+        fetch_timer = generator.timer
+    
+    samples, steps, start = 0, 0, time.perf_counter()
+    try:
+        while True:
+            fetch_start = time.perf_counter()
+            try:
+                inputs, _ = next(batches)
+            except StopIteration:
+                break
+            if generator is None:
+                fetch_timer.add('fetch', time.perf_counter() - fetch_start)
+            samples += len(inputs['image'])
+            steps += 1
+    finally:
+        if generator is not None:
+            generator.close()
+    elapsed = time.perf_counter() - start
+    
+    totals = fetch_timer.reset()
+    steps = max(steps, 1)
+    print(f" {samples} samples in {elapsed:.2f}s: {samples / max(elapsed, 1e-9):.1f} samples/s")
+    for stage in ['fetch', *INPUT_STAGES]:
+        if stage in totals:
+            print(f"   {stage}: {totals[stage] / steps * 1000:.2f} ms/batch")
+    if Config.USE_TF_DATA:
+        print("   (per-stage times are not available for tf.data; use --profile for a TensorBoard trace)")
+    
+    return {'samples': samples, 'seconds': elapsed, 'samples_per_sec': samples / max(elapsed, 1e-9), 'stages': totals}
+
+def profile_log_dir(name):
+    log_dir = os.path.join(Config.LOG_DIR, name)
+    os.makedirs(log_dir, exist_ok=True)
+    return log_dir
@@ -0,0 +1,245 @@
+"""
+Model registry over Config.MODEL_DIR for the web servers
+Finds checkpoints, loads new versions in the background and switches
+default traffic to them once they are warmed up, without a restart.
+"""
+
+import os
+import time
+import fnmatch
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from config import Config
+from src.backends import EXTENSIONS
+from src.loader import BackgroundLoader
+
+class ModelUnavailable(Exception):
+    """Raised by acquire(); `status` is 'loading', 'missing' or 'error'"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ModelRegistry:
+    """Versioned BanglaOCRPredictors, one per model file name in `model_dir`
+    
+    Default traffic goes to `active`: Config.MODEL_VERSION if set, otherwise
+    the newest file matching Config.REGISTRY_MODEL_GLOB, which a watcher
+    thread keeps following; other files (best-epoch checkpoints, float16 and
+    exported models) are served only when pinned. A new or
+    overwritten file is loaded and warmed up next to the serving model and
+    swapped in atomically when ready. Requests can pin any available version.
+    At most `max_loaded` models stay in memory, counting the ones still
+    loading; the least recently used one that is neither active nor serving
+    a request is evicted, and a pinned load that would exceed the limit is
+    refused with ModelUnavailable('loading') until one can be.
+    """
+    
+    def __init__(self, model_dir=None, max_loaded=None, poll_seconds=None):
+        self.model_dir = model_dir or Config.MODEL_DIR
+        self.max_loaded = max_loaded or Config.REGISTRY_MAX_MODELS
+        self.poll_seconds = Config.REGISTRY_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self.lock = threading.Lock()
+        self.loaders = OrderedDict()  # version -> BackgroundLoader, least recently used first
+        self.in_use = {}
+        self.pending = {}  # version -> loader replacing the current one
+        self.failed = {}  # version -> mtime of the file that failed to load
+        self.errors = {}  # version -> message of its last load error
+        self.active = None
+    
+    def available(self):
+        """{version: path} of model files that are not still being written
+        
+        The version is the file name, extension included, so exports of one
+        checkpoint ('x.h5', 'x.onnx') stay distinct.
+        """
+        models = {}
+        if not os.path.isdir(self.model_dir):
+            return models
+        
+        settled = time.time() - Config.REGISTRY_SETTLE_SECONDS
+        for name in os.listdir(self.model_dir):
+            ext = os.path.splitext(name)[1]
+            path = os.path.join(self.model_dir, name)
+            if ext.lower() in EXTENSIONS and os.path.getmtime(path) < settled:
+                models[name] = path
+        return models
+    
+    def followed(self, models):
+        """Versions in `models` that may become the default automatically"""
+        return [version for version in models if fnmatch.fnmatch(version, Config.REGISTRY_MODEL_GLOB)]
+    
+    def latest(self):
+        models = self.available()
+        return max(self.followed(models), key=lambda version: os.path.getmtime(models[version]), default=None)
+    
+    def start(self):
+        target = Config.MODEL_VERSION or self.latest()
+        if target is None:
+            print(f"Warning: No model matching {Config.REGISTRY_MODEL_GLOB} found in {self.model_dir}")
+            print("Please train the model first or set MODEL_DIR / MODEL_VERSION")
+        else:
+            try:
+                self.load(target, make_default=True)
+            except ModelUnavailable as e:
+                # Not there yet (or still being written); the watcher retries
+                print(f"Warning: {e}")
+        
+        if self.poll_seconds:
+            threading.Thread(target=self._watch, name='model-watcher', daemon=True).start()
+        return self
+    
+    def load(self, version, make_default=False):
+        """Load `version` in the background; with make_default it becomes active once warm"""
+        path = self.available().get(version)
+        if path is None:
+            raise ModelUnavailable('missing', f"Unknown model version '{version}'")
+        mtime = os.path.getmtime(path)
+        
+        with self.lock:
+            self._reap()
+            loader = self.pending.get(version)
+            if loader is None:
+                if self.failed.get(version) == mtime:
+                    raise ModelUnavailable('error', f"Model version '{version}' failed to load: {self.errors[version]}")
+                if not make_default:
+                    # The new default always loads; anything else needs a free slot
+                    self._evict(reserve=1)
+                    busy = len(self.loaders) + len(self.pending)
+                    if busy >= self.max_loaded:
+                        raise ModelUnavailable('loading', f"Model version '{version}' cannot load yet, "
+                                               f"{busy} of {self.max_loaded} models loaded or loading; retry shortly.")
+                loader = BackgroundLoader(path, on_ready=lambda loader: self._swap(version, loader))
+                loader.mtime = mtime
+                loader.make_default = make_default
+                self.pending[version] = loader
+                loader.start()
+            loader.make_default |= make_default
+        return loader
+    
+    def _reap(self):
+        # Failed loads are retried only once their file changes
+        for version, loader in list(self.pending.items()):
+            if loader.status == 'error':
+                self.failed[version] = loader.mtime
+                self.errors[version] = loader.error
+                del self.pending[version]
+    
+    def _swap(self, version, loader):
+        with self.lock:
+            self.loaders[version] = loader
+            self.loaders.move_to_end(version)
+            self.pending.pop(version, None)
+            if loader.make_default or version == self.active:
+                self.active = version
+            self._evict()
+        print(f"Loaded model version: {version} (serving: {self.active})")
+    
+    def _evict(self, reserve=0):
+        for version in list(self.loaders):
+            if len(self.loaders) + len(self.pending) + reserve <= self.max_loaded:
+                break
+            if version != self.active and not self.in_use.get(version):
+                del self.loaders[version]
+                print(f"Evicted model version: {version}")
+    
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self._poll()
+            except OSError as e:
+                # A file removed between listing and stat; try again next round
+                print(f"Model directory scan failed: {e}")
+    
+    def _poll(self):
+        models = self.available()
+        
+        with self.lock:
+            self._reap()
+            target = Config.MODEL_VERSION
+            if target is None:
+                # Newest checkpoint that has not failed to load in its current state
+                usable = [version for version in self.followed(models)
+                          if self.failed.get(version) != os.path.getmtime(models[version])]
+                target = max(usable, key=lambda version: os.path.getmtime(models[version]), default=None)
+            
+            stale = []
+            # The default version if it is new, plus loaded versions whose file was overwritten
+            for version in dict.fromkeys([target, *self.loaders]):
+                if version not in models or version in self.pending:
+                    continue
+                mtime = os.path.getmtime(models[version])
+                loaded = self.loaders.get(version)
+                if self.failed.get(version) == mtime:
+                    continue
+                if loaded is None or loaded.mtime < mtime:
+                    stale.append(version)
+                elif version == target and self.active != target:
+                    # Already loaded and warm (e.g. pinned earlier): switch right away
+                    self.active = target
+        
+        for version in stale:
+            try:
+                self.load(version, make_default=version == target)
+            except ModelUnavailable as e:
+                print(f"Model reload skipped: {e}")
+    
+    @contextmanager
+    def acquire(self, version=None):
+        """Yield (version, predictor) for `version` or the active model
+        
+        A pinned version that is not loaded yet starts loading and raises
+        ModelUnavailable('loading'); retry once it is ready.
+        """
+        with self.lock:
+            self._reap()
+            version = version or self.active
+            if version is None:
+                if self.pending:
+                    raise ModelUnavailable('loading', "Model is still loading, retry shortly.")
+                if self.failed:
+                    raise ModelUnavailable('error', "Model failed to load: " + '; '.join(
+                        f"{version}: {error}" for version, error in self.errors.items()))
+                raise ModelUnavailable('missing', "Model not loaded. Please train the model first.")
+            # Looked up and marked in use together, so it cannot be evicted in between
+            loader = self.loaders.get(version)
+            if loader is not None:
+                self.loaders.move_to_end(version)
+                self.in_use[version] = self.in_use.get(version, 0) + 1
+        
+        if loader is None:
+            self.load(version)
+            raise ModelUnavailable('loading', f"Model version '{version}' is loading, retry shortly.")
+        
+        try:
+            yield version, loader.predictor
+        finally:
+            with self.lock:
+                self.in_use[version] -= 1
+    
+    def status(self):
+        """'ready' once a default model serves, else 'loading', 'error' or 'missing'"""
+        with self.lock:
+            self._reap()
+            if self.active is not None:
+                return 'ready'
+            if self.pending:
+                return 'loading'
+            return 'error' if self.failed else 'missing'
+    
+    def health(self):
+        with self.lock:
+            self._reap()
+            loaded = {version: {**loader.health(), 'in_use': self.in_use.get(version, 0)}
+                      for version, loader in self.loaders.items()}
+            pending = {version: loader.health() for version, loader in self.pending.items()}
+        return {
+            'status': self.status(),
+            'model_loaded': self.active is not None,
+            'active_version': self.active,
+            'models': loaded,
+            'loading': pending,
+            'failed': sorted(self.failed),
+        }
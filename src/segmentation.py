@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import cv2
+from config import Config
+
+def binarize(img):
+    """Otsu threshold with ink as 255 on a 0 background"""
+    blurred = cv2.GaussianBlur(img, (3, 3), 0)
+    _, binary = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return binary
+
+def find_line_boxes(img):
+    """Find text line boxes (y0, y1, x0, x1) in reading order using a horizontal projection profile"""
+    binary = binarize(img)
+    profile = binary.sum(axis=1) / 255.0
+    if profile.max() == 0:
+        return []
+    
+    rows = profile > max(1.0, profile.max() * Config.LINE_PROFILE_THRESHOLD)
+    
+    # Runs of text rows
+    edges = np.diff(np.concatenate([[0], rows.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    
+    # Merge runs split by thin gaps (dots, matras)
+    runs = []
+    for start, end in zip(starts, ends):
+        if runs and start - runs[-1][1] < Config.LINE_MIN_GAP:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+    
+    height, width = img.shape[:2]
+    boxes = []
+    for start, end in runs:
+        if end - start < Config.LINE_MIN_HEIGHT:
+            continue
+        
+        y0 = max(0, start - Config.LINE_MARGIN)
+        y1 = min(height, end + Config.LINE_MARGIN)
+        
+        cols = np.flatnonzero(binary[start:end].any(axis=0))
+        x0 = max(0, cols[0] - Config.LINE_MARGIN)
+        x1 = min(width, cols[-1] + 1 + Config.LINE_MARGIN)
+        
+        boxes.append((int(y0), int(y1), int(x0), int(x1)))
+    
+    return boxes
+
+def segment_lines(img):
+    """Split a grayscale paragraph image into line crops, top to bottom"""
+    boxes = find_line_boxes(img)
+    if not boxes:
+        return [img]
+    return [img[y0:y1, x0:x1] for y0, y1, x0, x1 in boxes]
@@ -3,19 +3,38 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import tensorflow as tf
-from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau
+from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau, TensorBoard
 import os
 from datetime import datetime
 from config import Config
-from src.model import build_training_model
-from src.data_preprocessing import DataGenerator
+from src.model import build_training_model, apply_precision_policy, build_float16_model
+from src.data_preprocessing import DataGenerator, load_annotations, make_tf_dataset
+from src.profiling import make_profiler_callback, profile_input_pipeline, profile_log_dir
 
-def train_model():
+class PredictionModelCheckpoint(ModelCheckpoint):
+    """ModelCheckpoint that saves the image -> softmax model instead of the
+    training model, so best-epoch files load without the CTCLayer"""
+    
+    def __init__(self, pred_model, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pred_model = pred_model
+    
+    def set_model(self, model):
+        super().set_model(self.pred_model)
+
+def train_model(profile=None):
+    profile = Config.PROFILE_TRAINING if profile is None else profile
+    
     print("="*70)
     print("🇧🇩 Bangla Handwritten OCR - Training")
     print("="*70)
     print()
     
+    if Config.XLA_JIT:
+        # Checked before any data is loaded instead of failing at the first step
+        raise ValueError("XLA_JIT is not supported with TensorFlow 2.15: tf.nn.ctc_loss uses InplaceAdd, "
+                         "which has no XLA kernel. Set Config.XLA_JIT = False.")
+    
     # Check if data exists
     if not os.path.exists(Config.TRAIN_DIR):
         print(" Training data not found!")
@@ -25,101 +44,154 @@ def train_model():
     
     # Load data
     print(" Loading data...")
-    train_gen = DataGenerator(Config.TRAIN_DIR, Config.BATCH_SIZE, augment=True)
-    val_gen = DataGenerator(Config.VAL_DIR, Config.BATCH_SIZE, augment=False)
-    
-    print(f" Train samples: {len(train_gen.samples)}")
-    print(f" Val samples: {len(val_gen.samples)}")
-    print()
-    
-    if len(train_gen.samples) == 0:
-        print(" No training samples found!")
-        print("Check that data/train/annotations.json has entries")
-        return
-    
-    # Build model
-    print("  Building model...")
-    training_model, pred_model = build_training_model()
-    
-    optimizer = tf.keras.optimizers.Adam(Config.LEARNING_RATE)
-    training_model.compile(optimizer=optimizer)
-    
-    print()
-    print("Model Summary:")
-    print("-" * 70)
-    pred_model.summary()
-    print("-" * 70)
-    print()
-    
-    # Callbacks
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    model_name = f"bangla_ocr_{timestamp}"
-    
-    callbacks = [
-        ModelCheckpoint(
-            os.path.join(Config.MODEL_DIR, f'{model_name}_best.h5'),
-            monitor='val_loss',
-            save_best_only=True,
-            verbose=1
-        ),
-        EarlyStopping(
-            monitor='val_loss',
-            patience=Config.EARLY_STOPPING_PATIENCE,
-            restore_best_weights=True,
-            verbose=1
-        ),
-        ReduceLROnPlateau(
-            monitor='val_loss',
-            factor=0.5,
-            patience=Config.REDUCE_LR_PATIENCE,
-            min_lr=1e-7,
-            verbose=1
-        )
-    ]
-    
-    # Train
-    print(" Starting training...")
-    print(f"   Epochs: {Config.EPOCHS}")
-    print(f"   Batch size: {Config.BATCH_SIZE}")
-    print(f"   Learning rate: {Config.LEARNING_RATE}")
-    print()
+    if Config.USE_TF_DATA:
+        print(" Input pipeline: tf.data")
+        train_gen = make_tf_dataset(Config.TRAIN_DIR, Config.BATCH_SIZE, augment=True,
+                                    shuffle=True, cache=Config.TF_DATA_CACHE)
+        val_gen = make_tf_dataset(Config.VAL_DIR, Config.BATCH_SIZE, augment=False,
+                                  cache=Config.TF_DATA_CACHE)
+        train_count = len(load_annotations(Config.TRAIN_DIR))
+        val_count = len(load_annotations(Config.VAL_DIR))
+    else:
+        train_gen = DataGenerator(Config.TRAIN_DIR, Config.BATCH_SIZE, augment=True, shuffle=True, profile=profile)
+        val_gen = DataGenerator(Config.VAL_DIR, Config.BATCH_SIZE, augment=False)
+        if Config.DATA_WORKERS > 0:
+            print(f" Input workers: {Config.DATA_WORKERS}")
+        train_count = len(train_gen.samples)
+        val_count = len(val_gen.samples)
     
+    # Worker pools must be stopped on every way out, early returns included
     try:
-        history = training_model.fit(
-            train_gen,
-            validation_data=val_gen,
-            epochs=Config.EPOCHS,
-            callbacks=callbacks,
-            verbose=1
-        )
-    except KeyboardInterrupt:
-        print("\n\n  Training interrupted by user")
-        print("Partial model may be saved")
-    except Exception as e:
-        print(f"\n\n Training error: {e}")
-        import traceback
-        traceback.print_exc()
-        return
-    
-    # Save final model
-    final_path = os.path.join(Config.MODEL_DIR, f'{model_name}_final.h5')
-    pred_model.save(final_path)
-    
-    print()
-    print("="*70)
-    print(" Training complete!")
-    print("="*70)
-    print()
-    print(f" Model saved:")
-    print(f"   Best: {Config.MODEL_DIR}/{model_name}_best.h5")
-    print(f"   Final: {final_path}")
-    print()
-    print(" Next steps:")
-    print("   - Test: python src/predict.py <model_path> <image_path>")
-    print("   - Web App: python app/app.py")
-    print()
-    
-    return history, pred_model
+        print(f" Train samples: {train_count}")
+        print(f" Val samples: {val_count}")
+        print()
+        
+        if train_count == 0:
+            print(" No training samples found!")
+            print("Check that data/train/annotations.json has entries")
+            return
+        
+        # Build model
+        print("  Building model...")
+        policy = apply_precision_policy()
+        training_model, pred_model = build_training_model()
+        
+        # Under mixed_float16, compile() wraps the optimizer for loss scaling
+        optimizer = tf.keras.optimizers.Adam(Config.LEARNING_RATE)
+        training_model.compile(optimizer=optimizer)
+        print(f" Precision: {policy}")
+        
+        print()
+        print("Model Summary:")
+        print("-" * 70)
+        pred_model.summary()
+        print("-" * 70)
+        print()
+        
+        # Callbacks
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        model_name = f"bangla_ocr_{timestamp}"
+        
+        callbacks = [
+            PredictionModelCheckpoint(
+                pred_model,
+                os.path.join(Config.MODEL_DIR, f'{model_name}_best.h5'),
+                monitor='val_loss',
+                save_best_only=True,
+                verbose=1
+            ),
+            EarlyStopping(
+                monitor='val_loss',
+                patience=Config.EARLY_STOPPING_PATIENCE,
+                restore_best_weights=True,
+                verbose=1
+            ),
+            ReduceLROnPlateau(
+                monitor='val_loss',
+                factor=0.5,
+                patience=Config.REDUCE_LR_PATIENCE,
+                min_lr=1e-7,
+                verbose=1
+            )
+        ]
+        
+        if profile:
+            # Per-epoch stage table plus a TensorBoard trace of PROFILE_BATCHES
+            log_dir = profile_log_dir(model_name)
+            generator = train_gen if isinstance(train_gen, DataGenerator) else None
+            callbacks.append(make_profiler_callback(generator, train_count, os.path.join(log_dir, 'profile.txt')))
+            callbacks.append(TensorBoard(log_dir=log_dir, profile_batch=Config.PROFILE_BATCHES))
+            print(f" Profiling: {log_dir}")
+        
+        # Train
+        print(" Starting training...")
+        print(f"   Epochs: {Config.EPOCHS}")
+        print(f"   Batch size: {Config.BATCH_SIZE}")
+        print(f"   Learning rate: {Config.LEARNING_RATE}")
+        print()
+        
+        try:
+            history = training_model.fit(
+                train_gen,
+                validation_data=val_gen,
+                epochs=Config.EPOCHS,
+                callbacks=callbacks,
+                # Both pipelines shuffle themselves; keeping Keras' batch order
+                # lets DataGenerator workers prefetch the right batches
+                shuffle=False,
+                verbose=1
+            )
+        except KeyboardInterrupt:
+            print("\n\n  Training interrupted by user")
+            print("Partial model may be saved")
+        except Exception as e:
+            print(f"\n\n Training error: {e}")
+            import traceback
+            traceback.print_exc()
+            return
+        
+        # Save final model
+        final_path = os.path.join(Config.MODEL_DIR, f'{model_name}_final.h5')
+        pred_model.save(final_path)
+        
+        fp16_path = None
+        if Config.MIXED_PRECISION:
+            fp16_path = os.path.join(Config.MODEL_DIR, f'{model_name}_final_fp16.h5')
+            build_float16_model(pred_model).save(fp16_path)
+        
+        print()
+        print("="*70)
+        print(" Training complete!")
+        print("="*70)
+        print()
+        print(f" Model saved:")
+        print(f"   Best: {Config.MODEL_DIR}/{model_name}_best.h5")
+        print(f"   Final: {final_path}")
+        if fp16_path:
+            print(f"   Float16: {fp16_path}")
+        print()
+        print(" Next steps:")
+        print("   - Test: python src/predict.py <model_path> <image_path>")
+        print("   - Web App: python app/app.py")
+        print()
+        
+        return history, pred_model
+    finally:
+        for gen in (train_gen, val_gen):
+            if isinstance(gen, DataGenerator):
+                gen.close()
 
 if __name__ == "__main__":
-    train_model()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Train the Bangla OCR model")
+    parser.add_argument('--profile', action='store_true',
+                        help="time input stages and train steps per epoch, write a TensorBoard trace")
+    parser.add_argument('--profile-input', action='store_true',
+                        help="run only the input pipeline (no model) and report its maximum samples/sec")
+    parser.add_argument('--max-batches', type=int, default=None, help="batches for --profile-input")
+    args = parser.parse_args()
+    
+    if args.profile_input:
+        profile_input_pipeline(max_batches=args.max_batches)
+    else:
+        train_model(profile=args.profile or None)
\ No newline at end of file
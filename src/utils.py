@@ -2,7 +2,6 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-import tensorflow as tf
 import numpy as np
 import cv2
 from config import Config
@@ -23,47 +22,159 @@ def decode_prediction(prediction):
             text += Config.IDX_TO_CHAR[idx]
     return text
 
-def preprocess_image(image_path):
-    """Load and preprocess image"""
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+# Codepoint -> class index lookup table (-1 for characters outside the charset)
+CHAR_LUT = np.full(max(ord(char) for char in Config.CHARACTERS) + 1, -1, dtype=np.int32)
+for _char, _idx in Config.CHAR_TO_IDX.items():
+    CHAR_LUT[ord(_char)] = _idx
+IDX_CHARS = np.array([Config.IDX_TO_CHAR[idx] for idx in range(len(Config.IDX_TO_CHAR))])
+
+def encode_batch(texts, max_len=Config.MAX_TEXT_LENGTH):
+    """Encode strings into a zero-padded (N, max_len) int32 matrix plus lengths
+    
+    Same mapping as encode_text: unknown characters are dropped and long
+    labels are truncated.
+    """
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32)
+    rows = np.repeat(np.arange(len(texts)), lengths)
+    
+    idx = np.full(len(codes), -1, dtype=np.int32)
+    known = codes < len(CHAR_LUT)
+    idx[known] = CHAR_LUT[codes[known]]
+    keep = idx >= 0
+    idx, rows = idx[keep], rows[keep]
+    
+    # Column of each kept character within its own row
+    counts = np.bincount(rows, minlength=len(texts))
+    cols = np.arange(len(idx)) - (np.cumsum(counts) - counts)[rows]
+    fits = cols < max_len
+    
+    labels = np.zeros((len(texts), max_len), dtype=np.int32)
+    labels[rows[fits], cols[fits]] = idx[fits]
+    return labels, np.minimum(counts, max_len).astype(np.int32)
+
+def decode_batch(prediction, collapse=True):
+    """Greedy CTC decode of (N, T, C) model output or (N, T) index rows
+    
+    Repeats are collapsed, then blanks and padding (-1) are removed. Pass
+    collapse=False for rows that are already CTC-decoded.
+    """
+    best = np.asarray(prediction)
+    if best.ndim == 3:
+        best = best.argmax(axis=-1)
+    
+    keep = (best >= 0) & (best < len(IDX_CHARS))
+    if collapse:
+        keep[:, 1:] &= best[:, 1:] != best[:, :-1]
+    
+    chars = IDX_CHARS[best[keep]].tolist()
+    ends = np.cumsum(keep.sum(axis=1)).tolist()
+    return [''.join(chars[start:end]) for start, end in zip([0] + ends[:-1], ends)]
+
+def sequence_confidence(prediction):
+    """Best-path probability of each row of (N, T, C) output, as a geometric mean over time steps"""
+    best = np.max(prediction, axis=-1)
+    return np.exp(np.log(np.maximum(best, 1e-12)).mean(axis=1)).tolist()
+
+def decode_image(data):
+    """Decode an encoded image (PNG/JPEG/... bytes or 1-D uint8 buffer) to grayscale"""
+    buf = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.ravel()
+    if buf.size == 0:
+        return None
+    return cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+
+def edit_distance(a, b):
+    """Levenshtein distance between two sequences"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+def character_error_rate(predictions, targets):
+    """Total character edits over total target characters"""
+    edits = sum(edit_distance(p, t) for p, t in zip(predictions, targets))
+    return edits / max(sum(len(t) for t in targets), 1)
+
+def load_image(source):
+    """Load image as grayscale array (None if unreadable)
+    
+    `source` can be a file path, encoded bytes, a file-like object, a 1-D
+    uint8 buffer of encoded bytes or an already decoded image array.
+    """
+    if isinstance(source, np.ndarray):
+        if source.ndim == 1:
+            return decode_image(source)
+        if source.ndim == 3 and source.shape[2] == 1:
+            return source[:, :, 0]
+        if source.ndim == 3:
+            return cv2.cvtColor(source, cv2.COLOR_BGR2GRAY)
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return decode_image(source)
+    if hasattr(source, 'read'):
+        return decode_image(source.read())
+    return cv2.imread(str(source), cv2.IMREAD_GRAYSCALE)
+
+def preprocess_image(source, width=None):
+    """Load and preprocess image from any source load_image accepts"""
+    img = load_image(source)
     if img is None:
         return None
     
-    img = cv2.resize(img, (Config.IMG_WIDTH, Config.IMG_HEIGHT))
+    return preprocess_array(img, width)
+
+def preprocess_array(img, width=None):
+    """Resize and normalize an already loaded grayscale image"""
+    img = resize_image(img, width)
     img = img.astype(np.float32) / 255.0
     img = np.expand_dims(img, axis=-1)
     
     return img
 
-class CTCLayer(tf.keras.layers.Layer):
-    """Custom CTC layer for training"""
+def resize_image(img, width=None):
+    """Convert to grayscale and resize to model input size, keeping uint8
+    
+    In bucket mode `width` forces the bucket (e.g. the one a training batch
+    was grouped into) instead of picking it from the image's aspect ratio.
+    """
+    if img.ndim == 3 and img.shape[2] == 1:
+        img = img[:, :, 0]
+    elif img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    
+    if Config.RESIZE_MODE == 'bucket':
+        return resize_to_bucket(img, width)
+    return cv2.resize(img, (Config.IMG_WIDTH, Config.IMG_HEIGHT))
+
+def bucket_width(width, height):
+    """Smallest width bucket that fits an image once scaled to IMG_HEIGHT"""
+    scaled = int(round(width * Config.IMG_HEIGHT / max(height, 1)))
+    for bucket in Config.WIDTH_BUCKETS:
+        if scaled <= bucket:
+            return bucket
+    return Config.WIDTH_BUCKETS[-1]
+
+def resize_to_bucket(img, bucket=None):
+    """Resize keeping aspect ratio, then pad on the right to the width bucket"""
+    height, width = img.shape[:2]
+    bucket = bucket or bucket_width(width, height)
+    scaled = int(round(width * Config.IMG_HEIGHT / max(height, 1)))
+    scaled = min(bucket, max(1, scaled))
     
-    def __init__(self, name=None):
-        super().__init__(name=name)
-        
-    def call(self, y_true, y_pred):
-        # Get batch size
-        batch_len = tf.cast(tf.shape(y_true)[0], dtype="int32")
-        
-        # Input length is the time dimension of predictions
-        input_length = tf.cast(tf.shape(y_pred)[1], dtype="int32")
-        input_length = input_length * tf.ones(shape=(batch_len,), dtype="int32")
-        
-        # Label length - count non-zero elements in each label
-        label_length = tf.cast(tf.reduce_sum(tf.cast(y_true != 0, dtype="int32"), axis=1), dtype="int32")
-        
-        # Compute CTC loss
-        loss = tf.nn.ctc_loss(
-            labels=tf.cast(y_true, dtype="int32"),
-            logits=y_pred,
-            label_length=label_length,
-            logit_length=input_length,
-            logits_time_major=False,
-            blank_index=-1
-        )
-        
-        # Add loss to layer
-        self.add_loss(tf.reduce_mean(loss))
-        
-        # Return predictions unchanged
-        return y_pred
\ No newline at end of file
+    img = cv2.resize(img, (scaled, Config.IMG_HEIGHT))
+    if scaled < bucket:
+        img = cv2.copyMakeBorder(img, 0, 0, 0, bucket - scaled, cv2.BORDER_CONSTANT, value=255)
+    
+    return img
+
+def __getattr__(name):
+    # CTCLayer lives in src.model so that inference code never imports TensorFlow
+    if name == 'CTCLayer':
+        from src.model import CTCLayer
+        return CTCLayer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")